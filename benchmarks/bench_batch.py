@@ -0,0 +1,49 @@
+'''
+Scaling of Template.render_many with the count of worker processes.
+
+Renders the page layout of bench_parser for many parameter sets serially
+and with 2, 4, ... workers up to the count of cpus (or the given maximum).
+
+usage: python benchmarks/bench_batch.py [pages] [chunksize] [max workers]
+'''
+
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from mrkev.interpreter import Template
+from bench_parser import LAYOUT
+
+def generateParams(pages):
+    return [{'items': [{'url': '/%d/%d' % (p, i), 'title': 'Item %d' % i} for i in range(20)]}
+        for p in range(pages)]
+
+def measure(f):
+    start = time.time()
+    res = f()
+    return time.time() - start, res
+
+def getWorkerCounts(maxWorkers):
+    counts = [2]
+    while counts[-1] < maxWorkers:
+        counts.append(min(counts[-1] * 2, maxWorkers))
+    return counts
+
+def main(args):
+    pages = int(args[0]) if args else 5000
+    chunksize = int(args[1]) if len(args) > 1 else 16
+    maxWorkers = int(args[2]) if len(args) > 2 else multiprocessing.cpu_count()
+    template = Template(LAYOUT, compiled=True)
+    params = generateParams(pages)
+    serial, expected = measure(lambda: [template.render(**kwargs) for kwargs in params])
+    print 'serial render  %8.1f pages/s' % (pages / serial)
+    for workers in getWorkerCounts(maxWorkers):
+        seconds, res = measure(lambda: list(template.render_many(params, workers=workers, chunksize=chunksize)))
+        assert res == expected
+        print '%2d workers     %8.1f pages/s  (%.2fx)' % (workers, pages / seconds, serial / seconds)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,55 @@
+'''
+Interpreted and compiled (mrkev.compiler) rendering.
+
+Renders a page with a List of rows, every row calls definitions of the
+template (Row, Cell, Link) with parameters. Both templates are measured in
+CPU time in turns, the median ratio of RUNS turns is reported.
+
+usage: python benchmarks/bench_compiled.py [rows]
+'''
+
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from mrkev.interpreter import Template
+
+PAGE = u'''
+[Page :=[<html><head><title>[#Title]</title></head><body>[Menu][#]</body></html>] Title=[Untitled]]
+[Menu :=[<ul>[Entry Target=[/] [Home]][Entry Target=[/about] [About]]</ul>]]
+[Entry :=[<li>[Link Target=#Target #]</li>]]
+[Link :=[<a href="[#Target]">[#]</a>]]
+[Cell :=[<td class="[#Class]">[#]</td>] Class=[cell]]
+[Row :=[<tr>[Cell [[#Order]]][Cell [[Link Target=[[#Url]] [[#Title]]]]][Cell Class=[num] [[#Price]]]</tr>]]
+[Page Title=[Products] [
+    <table>[List Seq=[[$rows]] [[Row Order=[[$Order]] Url=[[$Item.url]] Title=[[$Item.title]] Price=[[$Item.price]]]]]</table>
+]]
+'''
+
+RUNS = 11
+
+def measure(template, params, number):
+    timer = timeit.Timer(lambda: template.render(**params), timer=time.clock)
+    return min(timer.repeat(repeat=1, number=number)) / number
+
+def median(values):
+    return sorted(values)[len(values) // 2]
+
+def main(args):
+    rows = int(args[0]) if args else 200
+    params = {'rows': [{'url': u'/p/%d' % i, 'title': u'Product %d' % i, 'price': i * 10} for i in range(rows)]}
+    interpreted = Template(PAGE)
+    compiled = Template(PAGE, compiled=True)
+    assert interpreted.render(**params) == compiled.render(**params)
+    number = max(1, 2000 // rows)
+    runs = [(measure(interpreted, params, number), measure(compiled, params, number)) for _ in range(RUNS)]
+    before = median([b for b, a in runs])
+    after = median([a for b, a in runs])
+    print '%d rows  interpreted %8.2f ms  compiled %8.2f ms  (%.2fx)' % (
+        rows, before * 1e3, after * 1e3, median([b / a for b, a in runs]))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,67 @@
+'''
+Throughput of autoescape mode on table pages full of special characters.
+
+Compares rendering without escaping, escaping done in template methods by
+chained replace (the former escapeHtml, with quotes added) and autoescape
+mode. Both escaping templates render the same page, the page without
+escaping is the same text unescaped.
+
+usage: python benchmarks/bench_escape.py [rows]
+'''
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from mrkev.escape import Escaped
+from mrkev.interpreter import Template
+
+def escapeHtml(s):
+    s = s.replace('&', '&amp;')
+    s = s.replace('"', '&quot;')
+    s = s.replace('>', '&gt;')
+    s = s.replace('<', '&lt;')
+    s = s.replace("'", '&#39;')
+    return s
+
+class ReplacingTemplate(Template):
+    def mEscape(self, content):
+        return escapeHtml(content)
+
+RAW = u'''<table>[List Seq=[[$rows]] [<tr class="[If [[$Odd]] Then=[odd] Else=[even]]">
+<td>[$Item.name]</td><td>[$Item.email]</td><td>[$Item.note]</td></tr>]]</table>'''
+
+REPLACED = u'''<table>[List Seq=[[$rows]] [<tr class="[If [[$Odd]] Then=[odd] Else=[even]]">
+<td>[Escape [[$Item.name]]]</td><td>[Escape [[$Item.email]]]</td><td>[Escape [[$Item.note]]]</td></tr>]]</table>'''
+
+def generateRows(count):
+    return [{
+        'name': u'O\'Brien & Sons <%d>' % i,
+        'email': u'"user%d" <user%d@example.com>' % (i, i),
+        'note': u'plain text without special characters %d' % i,
+    } for i in range(count)]
+
+def measure(template, rows, number):
+    timer = timeit.Timer(lambda: template.render(rows=rows))
+    return min(timer.repeat(repeat=5, number=number)) / number
+
+def main(args):
+    count = int(args[0]) if args else 500
+    rows = generateRows(count)
+    number = max(1, 20000 // count)
+    raw = Template(RAW)
+    replaced = ReplacingTemplate(REPLACED)
+    escaped = Template(RAW, autoescape=True)
+    page = escaped.render(rows=rows)
+    assert '&lt;' in page and 'class="even"' in page and 'not found' not in page
+    assert replaced.render(rows=rows) == page
+    assert Escaped(page).unescape() == raw.render(rows=rows)
+    size = len(page)
+    for label, template in [('no escaping', raw), ('replace in method', replaced), ('autoescape', escaped)]:
+        seconds = measure(template, rows, number)
+        print '%-18s %8.2f ms  %6.1f MB/s' % (label, seconds * 1e3, size / seconds / 1e6)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,61 @@
+'''
+Recursive and iterative (StackInterpreter) evaluation.
+
+Renders the page layout of bench_parser, which is shallow, and a chain of
+definitions each calling the next one, which is as deep as it is long.
+Recursive interpreter stops at its recurrence limit of 30 calls.
+Both interpreters are measured (in CPU time) in turns, the median ratio of RUNS turns
+is reported, so drift of the machine load affects both of them.
+
+usage: python benchmarks/bench_nesting.py [depth]
+'''
+
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from mrkev.interpreter import Template
+from bench_parser import LAYOUT
+
+ITEMS = [{'url': '/%d' % i, 'title': 'Item %d' % i} for i in range(20)]
+
+def generateChain(depth):
+    ''' definitions L0 .. Ln, every one wraps the next one into a tag
+    '''
+    definitions = ''.join('[L%d :=[<div>[L%d]</div>]]' % (i, i + 1) for i in range(depth))
+    return definitions + '[L%d :=[end]][L0]' % depth
+
+RUNS = 21
+
+def measure(template, number):
+    timer = timeit.Timer(lambda: template.render(items=ITEMS), timer=time.clock)
+    return min(timer.repeat(repeat=1, number=number)) / number
+
+def median(values):
+    return sorted(values)[len(values) // 2]
+
+def compare(label, code, number):
+    recursive = Template(code)
+    iterative = Template(code, iterative=True)
+    assert recursive.render(items=ITEMS) == iterative.render(items=ITEMS)
+    runs = [(measure(recursive, number), measure(iterative, number)) for _ in range(RUNS)]
+    before = median([b for b, a in runs])
+    after = median([a for b, a in runs])
+    ratio = median([b / a for b, a in runs])
+    print '%-18s recursive %8.1f us  iterative %8.1f us  (%.2fx, min %.2fx)' % (
+        label, before * 1e6, after * 1e6, ratio, min(b / a for b, a in runs))
+
+def main(args):
+    depth = int(args[0]) if args else 900
+    compare('page layout', LAYOUT, 200)
+    compare('chain of 25', generateChain(25), 500)
+    template = Template(generateChain(depth), iterative=True)
+    output = template.render()
+    assert output.count('<div>') == depth and 'end' in output
+    print 'chain of %-9d iterative %8.1f us' % (depth, measure(template, 20) * 1e6)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
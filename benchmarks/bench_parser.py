@@ -0,0 +1,94 @@
+#encoding: utf-8
+'''
+Parse throughput of the regex based scanner compared with the former
+character by character scanner.
+
+usage: python benchmarks/bench_parser.py [size in KB]
+'''
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from mrkev.parser import Parser
+
+
+class CharacterParser(Parser):
+    ''' parser reading its input one character at a time (the former scanner)
+    '''
+    def __init__(self, content, filename='<stdin>'):
+        Parser.__init__(self, content, filename)
+        self.inputStream = iter(content)
+        self.currentChar = next(self.inputStream, self.EOF)
+
+    def getCurrent(self):
+        return self.currentChar
+
+    def next(self):
+        if self.currentChar != self.EOF:
+            self.currentChar = next(self.inputStream, self.EOF)
+
+    def readWhile(self, whileCond):
+        read = []
+        while True:
+            current = self.getCurrent()
+            if current != self.EOF and whileCond(current):
+                read.append(current)
+                self.next()
+            else:
+                return ''.join(read)
+
+    def readUntil(self, chars):
+        return self.readWhile(lambda c: c not in chars)
+
+    def readSpace(self):
+        return self.readWhile(lambda c: c.isspace())
+
+
+LAYOUT = u'''
+[*page layout*]
+[Page :=[
+    <html>
+    <head><title>[#Title]</title></head>
+    <body>
+        [Menu]
+        <div class="content">[#]</div>
+    </body>
+    </html>
+] Title=[Untitled]]
+[Menu :=[
+    [html.ul [
+        [html.li [[Link Target=[/] [Home]]]]
+        [html.li [[Link Target=[/about] [About us]]]]
+    ]]
+]]
+[Link :=[[html.a href=#Target #]]]
+[Page Title=[Čtení] [
+    Lorem ipsum dolor sit amet, consectetuer adipiscing elit.
+    [List Seq=[[$items]] Sep=[, ] [[Link Target=[[$Item.url]] [[$Item.title]]]]]
+]]
+'''
+
+def generateTemplate(size):
+    repeat = size // len(LAYOUT) + 1
+    return LAYOUT * repeat
+
+def measure(parserClass, code, number):
+    timer = timeit.Timer(lambda: parserClass(code).parse())
+    return min(timer.repeat(repeat=3, number=number)) / number
+
+def main(args):
+    size = int(args[0]) * 1024 if args else 200 * 1024
+    code = generateTemplate(size)
+    assert CharacterParser(code).parse() == Parser(code).parse()
+    results = []
+    for parserClass in (CharacterParser, Parser):
+        seconds = measure(parserClass, code, 3)
+        results.append(seconds)
+        print '%-16s %8.2f ms  %8.2f MB/s' % (parserClass.__name__, seconds * 1000, len(code) / seconds / 2**20)
+    print 'speedup: %.1fx' % (results[0] / results[1])
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
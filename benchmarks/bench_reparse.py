@@ -0,0 +1,45 @@
+'''
+Latency of reparsing a template library after an edit, full parse compared
+with Parser.reparse for edits at the start, middle and end of the file.
+
+Reparse parses only content around the edit and finds lines in it only,
+blocks after it are reused; spans are relative to their top-level block,
+so moving a following block costs one update of its origin.
+
+usage: python benchmarks/bench_reparse.py [lines]
+'''
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from mrkev.parser import Parser
+
+def generateLibrary(lines):
+    rows = []
+    for i in range(lines // 5):
+        rows.append(u'[Item%d :=[\n  <li class="[If [[$Odd]] Then=[odd]]">\n    [html.a href=[[$Item.url]] [[$Item.name]]]\n  </li>\n]]' % i)
+    return u'\n'.join(rows)
+
+def measure(f, number=5):
+    return min(timeit.Timer(f).repeat(repeat=number, number=1))
+
+def main(args):
+    lines = int(args[0]) if args else 5000
+    text = generateLibrary(lines)
+    inserted = u'\n  x=[y]'
+    print 'full parse       %8.2f ms' % (measure(lambda: Parser(text).parse()) * 1e3)
+    for label, position in [('start', 0.0), ('middle', 0.5), ('end', 1.0)]:
+        offset = text.index(u'">', int(len(text) * position) if position < 1 else text.rindex(u'<li'))
+        newText = text[:offset] + u'"' + inserted + text[offset + 1:]
+        def reparse():
+            previous = Parser(text).parse()
+            start = timeit.default_timer()
+            Parser(newText).reparse(previous, offset, 1, u'"' + inserted)
+            return timeit.default_timer() - start
+        print 'reparse %-8s %8.2f ms' % (label, min(reparse() for i in range(5)) * 1e3)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
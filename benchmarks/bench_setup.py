@@ -0,0 +1,55 @@
+'''
+Per render set up of small templates.
+
+Compares rendering where the render context (template functions and
+wrappers of m* methods) is built for every render, as it was before, with
+rendering which reuses the context built on the first render.
+
+usage: python benchmarks/bench_setup.py [renders] [methods]
+'''
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from mrkev.interpreter import Template
+
+def createTemplateClass(methods):
+    ''' template with the given count of m* methods, as real applications have
+    '''
+    def method(self, content):
+        return content
+    attributes = dict(('mMethod%d' % i, method) for i in range(methods))
+    return type('BenchTemplate', (Template,), attributes)
+
+class RebuildingTemplate(object):
+    ''' builds the render context for every render
+    '''
+    def __init__(self, templateClass, code):
+        self.template = templateClass(code)
+
+    def render(self, **kwargs):
+        self.template.builtins = None
+        return self.template.render(**kwargs)
+
+def measure(template, renders):
+    start = time.time()
+    for i in range(renders):
+        template.render(name=u'World')
+    return time.time() - start
+
+def main(args):
+    renders = int(args[0]) if args else 20000
+    methods = int(args[1]) if len(args) > 1 else 10
+    templateClass = createTemplateClass(methods)
+    code = u'<p>Hello [$name]</p>'
+    before = measure(RebuildingTemplate(templateClass, code), renders)
+    after = measure(templateClass(code), renders)
+    print 'rebuilt context %8.1f us/render' % (before / renders * 1e6)
+    print 'shared context  %8.1f us/render' % (after / renders * 1e6)
+    print 'speedup: %.1fx' % (before / after)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,57 @@
+'''
+Worker start up with and without the on-disk program cache.
+
+Loads every template of a generated template set through a fresh
+TemplateLoader, as a new worker process would do.
+
+usage: python benchmarks/bench_startup.py [template count] [template size in KB]
+'''
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from mrkev.loader import TemplateLoader
+from bench_parser import generateTemplate
+
+def createTemplateSet(directory, count, size):
+    names = []
+    for i in range(count):
+        name = 'template%03d.mrkev' % i
+        with open(os.path.join(directory, name), 'wb') as f:
+            #every template differs, so they get their own cache files
+            f.write((u'[*%d*]' % i + generateTemplate(size)).encode('utf-8'))
+        names.append(name)
+    return names
+
+def loadAll(directory, names, cacheDirectory):
+    start = time.time()
+    loader = TemplateLoader(directory, maxSize=len(names), cacheDirectory=cacheDirectory)
+    for name in names:
+        loader.get(name)
+    return time.time() - start
+
+def main(args):
+    count = int(args[0]) if args else 300
+    size = int(args[1]) * 1024 if len(args) > 1 else 20 * 1024
+    directory = tempfile.mkdtemp()
+    try:
+        names = createTemplateSet(directory, count, size)
+        cacheDirectory = os.path.join(directory, '__mrkevcache__')
+        results = [
+            ('no cache', loadAll(directory, names, None)),
+            ('cold cache', loadAll(directory, names, cacheDirectory)),
+            ('warm cache', loadAll(directory, names, cacheDirectory)),
+        ]
+        for label, seconds in results:
+            print '%-12s %8.1f ms' % (label, seconds * 1000)
+        print 'speedup: %.1fx' % (results[0][1] / results[2][1])
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,258 @@
+'''
+Benchmark suite of parser, translator and interpreter on generated workloads.
+
+Every workload is generated from fixed parameters, so runs on different
+revisions measure the same input. Stages are measured separately:
+
+    parse      Parser.parse of the source
+    translate  Translator.translate of the parsed blocks
+    evaluate   Interpreter.evalToString of the translated program (one render)
+
+For every stage ops/sec (best of repeats) and peak memory are reported,
+peak memory is the growth of resident memory while the stage runs once in
+a forked process (read from /proc, missing on other systems). Memory of all
+stages is measured before any timing, so forked processes do not reuse
+memory freed by the timing loops.
+
+usage:
+    python benchmarks/bench_suite.py run [-o results.json] [-w workload] [--quick]
+    python benchmarks/bench_suite.py compare before.json after.json [-t percent]
+
+compare exits with status 1 when a stage got slower by more than the
+threshold (10% by default).
+'''
+
+import argparse
+import ctypes
+import ctypes.util
+import gc
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import mrkev
+from mrkev.interpreter import Template
+from mrkev.parser import Parser
+from mrkev.translator import Translator
+
+FORMAT_VERSION = 1
+STAGES = ('parse', 'translate', 'evaluate')
+
+def flatText(paragraphs=2000):
+    ''' large text with few blocks
+    '''
+    sentence = u'Lorem ipsum dolor sit amet, consectetuer adipiscing elit, sed diam nonummy. '
+    code = u''.join(u'<p>%d. %s</p>\n' % (i, sentence * 3) if i % 50 else u'<p>[$name]</p>\n'
+        for i in range(paragraphs))
+    return code, {'name': u'World'}
+
+def nestedDefinitions(depth=25):
+    ''' definitions each defined inside of the previous one
+    '''
+    code = u'end'
+    for i in reversed(range(depth)):
+        code = u'[D%d :=[<div class="d%d">[#]%s</div>]][D%d [%d]]' % (i, i, code, i, i)
+    return code, {}
+
+def wideTable(rows=1000, columns=8):
+    ''' List over rows read by dotted names
+    '''
+    cells = u''.join(u'<td>[$Item.c%d]</td>' % c for c in range(columns))
+    code = u'<table>[List Seq=[[$rows]] [<tr>%s</tr>\n]]</table>' % cells
+    data = [dict(('c%d' % c, u'%d-%d' % (r, c)) for c in range(columns)) for r in range(rows)]
+    return code, {'rows': data}
+
+def htmlTags(rows=300):
+    ''' html.* tags with attributes in every row
+    '''
+    code = u'''[Cell :=[[html.td class=#Class [[html.a href=#Href title=#Title #]]]] Class=[cell]]
+[html.table class=[grid] [[List Seq=[[$rows]] [[html.tr id=[[$Item.id]] [
+    [Cell Href=[[$Item.url]] Title=[[$Item.title]] [[$Item.title]]]
+    [Cell Class=[num] Href=[#] Title=[order] [[$Order]]]
+    [html.td [[html.span class=[x] [[$Item.id]]][html.br]]]
+]]]]]]'''
+    data = [{'id': u'r%d' % i, 'url': u'/item/%d?a=1&b=2' % i, 'title': u'Item "%d" <new>' % i}
+        for i in range(rows)]
+    return code, {'rows': data}
+
+def smallRender():
+    ''' small page rendered many times
+    '''
+    return u'<p>Hello [$name], you have [$count] [If [$many] Then=[messages] Else=[message]].</p>', \
+        {'name': u'World', 'count': 3, 'many': True}
+
+WORKLOADS = [
+    ('flat_text', flatText),
+    ('nested_definitions', nestedDefinitions),
+    ('wide_table', wideTable),
+    ('html_tags', htmlTags),
+    ('small_render', smallRender),
+]
+
+def createStage(stage, code, params):
+    ''' function running the stage on the output of the previous stage
+    '''
+    if stage == 'parse':
+        return lambda: Parser(code).parse()
+    if stage == 'translate':
+        #translation does not change parsed blocks, they can be translated again
+        blocks = Parser(code).parse()
+        return lambda: Translator().translate(blocks)
+    template = Template(code)
+    return lambda: template.createInterpreter(params).evalToString()
+
+def measureSpeed(f, minTime, repeat):
+    ''' ops/sec of f, count of calls is raised until a repeat takes minTime
+    '''
+    number = 1
+    while True:
+        elapsed = timeLoop(f, number)
+        if elapsed >= minTime:
+            break
+        number *= 2 if elapsed <= 0 else max(2, int(minTime / elapsed) + 1)
+    best = min([elapsed] + [timeLoop(f, number) for i in range(repeat - 1)])
+    return number / best
+
+def timeLoop(f, number):
+    start = time.time()
+    for i in xrange(number):
+        f()
+    return time.time() - start
+
+def readMemory(field):
+    ''' value of /proc/self/status field in KB, None when it is not available
+    '''
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except IOError:
+        pass
+    return None
+
+def resetPeakMemory():
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except IOError:
+        return False
+
+def releaseMemory():
+    ''' free garbage and return freed heap to the system (glibc only), so the
+    stage does not reuse memory freed while its input was prepared
+    '''
+    gc.collect()
+    try:
+        ctypes.CDLL(ctypes.util.find_library('c')).malloc_trim(0)
+    except (OSError, AttributeError, TypeError):
+        pass
+
+def runForPeakMemory(generate, stage, connection):
+    code, params = generate()
+    f = createStage(stage, code, params)
+    releaseMemory()
+    ok = resetPeakMemory()
+    before = readMemory('VmRSS')
+    f()
+    peak = readMemory('VmHWM')
+    connection.send(peak - before if ok and peak is not None and before is not None else None)
+    connection.close()
+
+def measurePeakMemory(generate, stage):
+    ''' growth of resident memory in KB while stage of workload runs in a
+    forked process, the workload is generated there too
+    '''
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=runForPeakMemory, args=(generate, stage, sender))
+    process.start()
+    res = receiver.recv() if receiver.poll(600) else None
+    process.join()
+    return res
+
+def runWorkload(generate, minTime, repeat, memory):
+    code, params = generate()
+    res = {'sourceSize': len(code)}
+    for stage in STAGES:
+        res[stage] = {
+            'opsPerSec': measureSpeed(createStage(stage, code, params), minTime, repeat),
+            'peakMemoryKB': memory[stage],
+        }
+    return res
+
+def getEnvironment():
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'mrkev': mrkev.__version__,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+def run(options):
+    minTime, repeat = (0.05, 2) if options.quick else (0.2, 5)
+    results = {}
+    workloads = [(name, generate) for name, generate in WORKLOADS
+        if not options.workload or name in options.workload]
+    #processes are forked while this one has not run any timing loop
+    peakMemory = dict((name, dict((stage, measurePeakMemory(generate, stage)) for stage in STAGES))
+        for name, generate in workloads)
+    for name, generate in workloads:
+        results[name] = res = runWorkload(generate, minTime, repeat, peakMemory[name])
+        for stage in STAGES:
+            memory = res[stage]['peakMemoryKB']
+            print '%-20s %-10s %12.1f ops/s %10s KB' % (name, stage, res[stage]['opsPerSec'],
+                memory if memory is not None else '-')
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump({'version': FORMAT_VERSION, 'environment': getEnvironment(), 'results': results},
+                f, indent=2, sort_keys=True)
+
+def compare(options):
+    with open(options.before) as f:
+        before = json.load(f)['results']
+    with open(options.after) as f:
+        after = json.load(f)['results']
+    regressions = 0
+    print '%-20s %-10s %14s %14s %8s %12s' % ('workload', 'stage', 'before ops/s', 'after ops/s', 'change', 'memory KB')
+    for name in sorted(set(before) & set(after)):
+        for stage in STAGES:
+            old, new = before[name][stage], after[name][stage]
+            change = (new['opsPerSec'] / old['opsPerSec'] - 1) * 100
+            slower = change < -options.threshold
+            regressions += slower
+            memory = '%s -> %s' % (old['peakMemoryKB'], new['peakMemoryKB'])
+            print '%-20s %-10s %14.1f %14.1f %+7.1f%% %12s%s' % (name, stage, old['opsPerSec'],
+                new['opsPerSec'], change, memory, '  SLOWER' if slower else '')
+    missing = sorted(set(before) ^ set(after))
+    if missing:
+        print 'workloads in one run only: %s' % ', '.join(missing)
+    return 1 if regressions else 0
+
+def main(args):
+    parser = argparse.ArgumentParser(description='mrkev benchmark suite')
+    commands = parser.add_subparsers(dest='command')
+    runParser = commands.add_parser('run', help='measure all workloads')
+    runParser.add_argument('-o', '--output', help='file for JSON results')
+    runParser.add_argument('-w', '--workload', action='append',
+        choices=[name for name, generate in WORKLOADS], help='measure only this workload')
+    runParser.add_argument('--quick', action='store_true', help='shorter and less precise measurement')
+    compareParser = commands.add_parser('compare', help='compare two saved runs')
+    compareParser.add_argument('before')
+    compareParser.add_argument('after')
+    compareParser.add_argument('-t', '--threshold', type=float, default=10.0,
+        help='slowdown in percent reported as regression')
+    options = parser.parse_args(args)
+    if options.command == 'run':
+        run(options)
+        return 0
+    return compare(options)
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
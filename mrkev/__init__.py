@@ -13,7 +13,8 @@ THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
 '''
 
 from mrkev.interpreter import Template
+from mrkev.loader import TemplateLoader, TemplateNotFound
 from mrkev.parser import MarkupSyntaxError, Parser
 
-__all__ = ['MarkupSyntaxError', 'Parser', 'Template']
+__all__ = ['MarkupSyntaxError', 'Parser', 'Template', 'TemplateLoader', 'TemplateNotFound']
 
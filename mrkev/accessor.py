@@ -0,0 +1,97 @@
+'''
+Compiled lookups of dotted names of the render context, e.g. $Item.url.
+
+Every name is split once, accessors are shared by all templates and
+created already when the program is resolved. Path is walked through
+mappings (anything with get), sequences by index and attributes of plain
+objects, list of one item stands for the item itself.
+'''
+
+from mrkev.escape import escapeOutput
+
+class Accessor(object):
+    __slots__ = ('name', 'head', 'path')
+
+    def __init__(self, name):
+        parts = name.split('.')
+        self.name = name
+        self.head = parts[0]
+        self.path = tuple(parts[1:])
+
+    def walk(self, obj):
+        ''' follows path from value of head, MISSING when it can not be followed
+        '''
+        for key in self.path:
+            if not obj:
+                break
+            if type(obj) is dict:
+                obj = obj.get(key)
+            else:
+                obj = getItem(obj, key)
+                if obj is MISSING:
+                    break
+        return obj
+
+class Missing(object):
+    def __repr__(self):
+        return 'MISSING'
+
+MISSING = Missing()
+
+def getItem(obj, key):
+    if type(obj) is dict:
+        return obj.get(key)
+    if isinstance(obj, (list, tuple)):
+        if key.isdigit():
+            index = int(key)
+            return obj[index] if index < len(obj) else MISSING
+        if not isinstance(obj, list) or len(obj) != 1:
+            return MISSING
+        obj = obj[0]
+    if hasattr(obj, 'get'):
+        return obj.get(key)
+    if key.startswith('_') or isinstance(obj, basestring):
+        return MISSING
+    value = getattr(obj, key, MISSING)
+    #methods are not values, template methods are called by the interpreter
+    if callable(value):
+        return MISSING
+    return value
+
+class Items(object):
+    ''' iterable value of the render context in place of a block
+
+    functions like List iterate it directly, without copying it into a list
+    '''
+    __slots__ = ('items', 'autoescape')
+
+    def __init__(self, items, autoescape=False):
+        self.items = items
+        self.autoescape = autoescape
+
+    def __call__(self, ip):
+        if self.autoescape:
+            return escapeOutput(self.items, ip.deferred)
+        return self.items
+
+def wrapValue(obj, autoescape=False, deferred=False):
+    ''' block rendering the value, its text is escaped in autoescape mode,
+    deferred is set when the value is rendered by Template.render_async
+    '''
+    if callable(obj):
+        if autoescape:
+            return lambda ip: escapeOutput(obj(ip), ip.deferred)
+        return obj
+    if hasattr(obj, '__iter__'):
+        return Items(obj, autoescape)
+    if autoescape:
+        obj = escapeOutput(obj, deferred)
+    return lambda ip: obj
+
+ACCESSORS = {}
+
+def getAccessor(name):
+    accessor = ACCESSORS.get(name)
+    if accessor is None:
+        accessor = ACCESSORS.setdefault(name, Accessor(name))
+    return accessor
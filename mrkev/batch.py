@@ -0,0 +1,73 @@
+'''
+Rendering of one template with many parameter sets in worker processes.
+
+The template is pickled once (see Template.__getstate__) and every worker
+loads it when it starts, items then carry only their parameters. Workers
+render with the template itself, so m* methods, template functions and
+attributes set by subclasses are the same, but every worker has its own
+fragment cache and memo (custom cacheBackend is not passed on).
+
+Worker which fails to load the template reports the error as result of
+every item it gets, so render_many raises it instead of waiting for workers
+restarted by the pool.
+'''
+
+import cPickle
+import multiprocessing
+
+#template of the worker process and error raised while loading it
+workerTemplate = None
+workerError = None
+
+def renderMany(template, params, workers=None, chunksize=16, ordered=True):
+    ''' generator of outputs of template.render(**kwargs) for kwargs in params
+
+    outputs are yielded in order of params, or as (index, output) in order of
+    completion when ordered is False; workers=None uses all cpus, one worker
+    renders in the current process
+    '''
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    if workers <= 1:
+        return renderSerial(template, params, ordered)
+    return renderInPool(template, params, workers, chunksize, ordered)
+
+def renderSerial(template, params, ordered):
+    for i, kwargs in enumerate(params):
+        output = template.render(**kwargs)
+        yield output if ordered else (i, output)
+
+def renderInPool(template, params, workers, chunksize, ordered):
+    #pickling errors are raised by render_many itself, before any worker starts
+    data = cPickle.dumps(template, cPickle.HIGHEST_PROTOCOL)
+    return iterPool(data, params, workers, chunksize, ordered)
+
+def iterPool(data, params, workers, chunksize, ordered):
+    pool = multiprocessing.Pool(workers, initWorker, (data,))
+    try:
+        if ordered:
+            results = pool.imap(renderItem, params, chunksize)
+        else:
+            results = pool.imap_unordered(renderIndexedItem, enumerate(params), chunksize)
+        for res in results:
+            yield res
+    finally:
+        pool.terminate()
+        pool.join()
+
+def initWorker(data):
+    global workerTemplate, workerError
+    try:
+        workerTemplate = cPickle.loads(data)
+    except Exception as e:
+        #pool restarts workers whose initializer raises, for ever
+        workerError = e
+
+def renderItem(kwargs):
+    if workerError is not None:
+        raise workerError
+    return workerTemplate.render(**kwargs)
+
+def renderIndexedItem(item):
+    i, kwargs = item
+    return i, renderItem(kwargs)
@@ -0,0 +1,230 @@
+'''
+Caches of rendered fragments and translated programs.
+
+[Cache Key=[...] Ttl=[...] [...]] stores rendered content under Key for Ttl
+seconds in the CacheBackend of the template (MemoryCache, in-process LRU
+cache, by default), see Template.Cache. ProgramCache keeps translated
+programs on disk, so they are not parsed again by other processes.
+'''
+
+from collections import OrderedDict
+import hashlib
+import marshal
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from mrkev import __version__
+from mrkev.parser import Parser
+from mrkev.serializer import SerializationError, dumpProgram, loadProgram
+from mrkev.translator import Translator
+
+class LRUCache(object):
+    ''' bounded mapping evicting least recently used items
+
+    all operations are guarded by lock, so the cache can be shared by threads
+    '''
+    def __init__(self, maxSize=100):
+        self.maxSize = maxSize
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                value = self.items.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self.items[key] = value
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.items.pop(key, None)
+            self.items[key] = value
+            while len(self.items) > self.maxSize:
+                self.items.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self.lock:
+            self.items.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+    def getStatistics(self):
+        return {
+            'size': len(self.items),
+            'maxSize': self.maxSize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+class CacheBackend(object):
+    ''' storage of fragments rendered by [Cache], e.g. client of memcached
+
+    values are unicode strings, ttl is in seconds, 0 means no expiration
+    '''
+    def get(self, key):
+        ''' returns stored value or None
+        '''
+        raise NotImplementedError()
+
+    def set(self, key, value, ttl=0):
+        raise NotImplementedError()
+
+    def getStatistics(self):
+        return {}
+
+
+class MemoryCache(CacheBackend):
+    ''' in-process backend, LRU cache of maxSize items which expire after ttl
+    '''
+    def __init__(self, maxSize=1000, clock=time.time):
+        self.items = LRUCache(maxSize)
+        self.clock = clock
+        self.expirations = 0
+
+    def get(self, key):
+        item = self.items.get(key)
+        if item is None:
+            return None
+        value, expires = item
+        if expires and expires <= self.clock():
+            self.items.delete(key)
+            self.expirations += 1
+            return None
+        return value
+
+    def set(self, key, value, ttl=0):
+        self.items.set(key, (value, self.clock() + ttl if ttl else 0))
+
+    def getStatistics(self):
+        return {
+            'size': len(self.items),
+            'evictions': self.items.evictions,
+            'expirations': self.expirations,
+        }
+
+
+class FragmentCache(object):
+    ''' counts hits and misses of fragments stored in backend
+    '''
+    def __init__(self, backend):
+        self.backend = backend
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.backend.get(key)
+        with self.lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=0):
+        self.backend.set(key, value, ttl)
+
+    def getStatistics(self):
+        res = {'evictions': 0}
+        res.update(self.backend.getStatistics())
+        res.update(hits=self.hits, misses=self.misses)
+        return res
+
+
+class ProgramCache(object):
+    ''' persistent cache of translated programs, similar to __pycache__
+
+    files are named by hash of the template source and its file name (kept
+    in source spans of the program) and contain mrkev and python version,
+    programs stored by other versions or corrupted files are ignored and
+    replaced by a fresh translation
+    '''
+    MAGIC = 'mrkev-program'
+    SUFFIX = '.mrkevc'
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self.invalid = 0
+
+    def getProgram(self, source, filename='<stdin>'):
+        key = self.getKey(source, filename)
+        program = self.load(key)
+        if program is None:
+            program = Translator().translate(Parser(source, filename).parse())
+            self.store(key, program)
+        return program
+
+    def getKey(self, source, filename='<stdin>'):
+        if isinstance(source, unicode):
+            source = source.encode('utf-8')
+        if isinstance(filename, unicode):
+            filename = filename.encode('utf-8')
+        return hashlib.sha1(filename + '\0' + source).hexdigest()
+
+    def getPath(self, key):
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def getHeader(self, key):
+        return (self.MAGIC, __version__, tuple(sys.version_info[:2]), key)
+
+    def load(self, key):
+        try:
+            with open(self.getPath(key), 'rb') as f:
+                data = f.read()
+        except IOError:
+            self.misses += 1
+            return None
+        try:
+            header, payload = marshal.loads(data)
+            if header != self.getHeader(key):
+                raise SerializationError('program stored by different version')
+            program = loadProgram(payload)
+        except (EOFError, ValueError, TypeError, SerializationError):
+            self.invalid += 1
+            return None
+        self.hits += 1
+        return program
+
+    def store(self, key, program):
+        data = marshal.dumps((self.getHeader(key), dumpProgram(program)))
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            #write to temporary file first, readers never see partial file
+            fd, tmpPath = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.rename(tmpPath, self.getPath(key))
+        except (IOError, OSError):
+            #cache is only an optimisation, template works without it
+            pass
+
+    def getStatistics(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalid': self.invalid,
+        }
@@ -0,0 +1,149 @@
+'''
+Compiles translated program into python functions.
+
+Every node which can be passed to Interpreter.eval (program root, content of
+definitions and scopes, parameter values) gets its own generated function.
+Nested content is flattened into straight line code, so the evaluation skips
+the type dispatch in Interpreter.eval.
+
+Calls bound to a definition (see mrkev.resolver) push their call scope and
+call the function of the definition content directly, parameters with a
+known frame read the nearest call of their definition and block scopes are
+pushed in place. Other calls (render context, dynamically bound names,
+memoized blocks) and missing parameters are delegated back to the
+interpreter, as are bound calls of profiled renders and calls evaluated in
+scopes pushed by template functions, hence the output and errors are the
+same.
+'''
+
+from mrkev.translator import CallBlock, CallParameter, BlockDefinition, BlockScope
+
+class Compiler(object):
+    def __init__(self, memoized=()):
+        #names of memoized blocks, their calls are always delegated
+        self.memoized = frozenset(memoized)
+        self.namespace = {}
+        self.lines = []
+        self.functions = []
+        self.queue = []
+        self.names = {}
+
+    def compile(self, program):
+        ''' returns dictionary mapping id of node to function(interpreter)
+        '''
+        self.addEntry(program)
+        while self.queue:
+            self.compileEntry(self.queue.pop())
+        code = compile('\n'.join(self.lines), '<mrkev>', 'exec')
+        exec(code, self.namespace)
+        return dict((nodeId, self.namespace[fname]) for nodeId, fname in self.functions)
+
+    def addEntry(self, node):
+        ''' name of function compiled from node, None for strings
+        '''
+        if isinstance(node, basestring):
+            return None
+        fname = self.names.get(id(node))
+        if fname is None:
+            fname = self.names[id(node)] = '_f%d' % len(self.names)
+            self.functions.append((id(node), fname))
+            self.queue.append(node)
+        return fname
+
+    def addConstant(self, node):
+        name = '_n%d' % len(self.namespace)
+        self.namespace[name] = node
+        return name
+
+    def compileEntry(self, node):
+        self.lines.append('def %s(ip):' % self.names[id(node)])
+        self.lines.append('    res = []')
+        for child in flatten(node if isinstance(node, list) else [node]):
+            self.compileNode(child, '    ')
+        self.lines.append('    return res')
+
+    def emit(self, indent, *lines):
+        self.lines.extend(indent + line for line in lines)
+
+    def compileNode(self, node, indent):
+        if isinstance(node, basestring):
+            if type(node) in (str, unicode):
+                self.emit(indent, 'res.append(%r)' % (node,))
+            else:
+                #e.g. mrkev.escape.Safe folded by optimizer keeps its type
+                self.emit(indent, 'res.append(%s)' % self.addConstant(node))
+        elif isinstance(node, CallBlock):
+            for value in node.params.values():
+                self.addEntry(value)
+            if isinstance(node.binding, BlockDefinition) and node.name not in self.memoized:
+                self.compileBoundCall(node, indent)
+            else:
+                self.emit(indent, 'res.extend(ip.evalCallBlock(%s))' % self.addConstant(node))
+        elif isinstance(node, CallParameter):
+            if node.slot is not None:
+                self.compileParameter(node, indent)
+            else:
+                self.emit(indent, 'res.extend(ip.evalParameter(%s))' % self.addConstant(node))
+        elif isinstance(node, BlockScope):
+            for definition in node.params.values():
+                self.addDefinition(definition)
+            self.emit(indent, 'ip.addBlockScope(%s)' % self.addConstant(node))
+            self.compileContent(node.content, indent)
+            self.emit(indent, 'ip.removeBlockScope()')
+        else:
+            self.emit(indent, 'res.extend(ip.eval(%s))' % self.addConstant(node))
+
+    def compileContent(self, content, indent):
+        fname = self.addEntry(content)
+        if fname is None:
+            self.compileNode(content, indent)
+        else:
+            self.emit(indent, 'res.extend(%s(ip))' % fname)
+
+    def compileBoundCall(self, node, indent):
+        ''' same steps as Interpreter.evalCallBlock for a BlockDefinition
+        '''
+        definition = node.binding
+        self.addDefinition(definition)
+        block = self.addConstant(node)
+        self.emit(indent,
+            'if ip.profile is not None or ip.pushedScopes:',
+            '    res.extend(ip.evalCallBlock(%s))' % block,
+            'else:',
+            '    ip.useCount += 1',
+            '    if ip.useCount > ip.RECURRENCE_LIMIT:',
+            '        res.extend(ip.createRecurrenceLimit(%r))' % (node.name,),
+            '    else:',
+            '        ip.addCallScope(%s, %s)' % (block, self.addConstant(definition)))
+        self.compileContent(definition.content, indent + '        ')
+        self.emit(indent, '        ip.leaveCallBlock()')
+
+    def compileParameter(self, node, indent):
+        ''' same lookup as Interpreter.findParameter for parameters with a frame
+        '''
+        name = '%r' % (node.name,)
+        self.emit(indent,
+            'calls = ip.frames.get(%d)' % node.slot,
+            'blocks = calls[-1].params.get(%s) if calls else None' % name)
+        if not node.inDefaultParameter and node.lexicalScope is not None:
+            self.emit(indent, 'if calls and not blocks:',
+                '    blocks = %s.params.get(%s)' % (self.addConstant(node.lexicalScope), name))
+        self.emit(indent,
+            'if blocks:',
+            '    res.extend(ip.eval(blocks))',
+            'else:',
+            '    res.extend(ip.evalParameter(%s))' % self.addConstant(node))
+
+    def addDefinition(self, definition):
+        if isinstance(definition, BlockDefinition):
+            self.addEntry(definition.content)
+            for value in definition.params.values():
+                self.addEntry(value)
+
+def flatten(content):
+    for node in content:
+        if isinstance(node, list):
+            for child in flatten(node):
+                yield child
+        else:
+            yield node
@@ -0,0 +1,87 @@
+'''
+Values computed concurrently with rendering.
+
+Deferred values are instances of Deferred below, of
+concurrent.futures.Future (when it is installed) and of types registered
+by registerDeferredType; other objects are plain values, even when they
+have result and done attributes. Template.render_async lets deferred values
+be values of the render context or results of m* methods and template
+functions, other renders treat them as plain values. They stay in the
+output as they are and are waited for when the whole template has been
+evaluated, so fetches started by sibling blocks run at the same time and
+the render takes about as long as the slowest one. Blocks which need the
+value itself (parameters of m* methods, If, List, dotted names like
+$user.name) wait for it when they read it.
+'''
+
+import sys
+import threading
+
+class Deferred(object):
+    ''' result of function running in its own thread
+    '''
+    def __init__(self, f, *args, **kwargs):
+        self.value = None
+        self.error = None
+        self.thread = threading.Thread(target=self.run, args=(f, args, kwargs))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self, f, args, kwargs):
+        try:
+            self.value = f(*args, **kwargs)
+        except Exception:
+            self.error = sys.exc_info()
+
+    def done(self):
+        return not self.thread.is_alive()
+
+    def result(self, timeout=None):
+        self.thread.join(timeout)
+        if self.error is not None:
+            raise self.error[0], self.error[1], self.error[2]
+        return self.value
+
+class MappedDeferred(object):
+    ''' deferred value converted by f when it is read
+    '''
+    def __init__(self, deferred, f):
+        self.deferred = deferred
+        self.f = f
+
+    def done(self):
+        return self.deferred.done()
+
+    def result(self, timeout=None):
+        return self.f(self.deferred.result(timeout))
+
+try:
+    from concurrent.futures import Future
+    DEFERRED_TYPES = (Deferred, MappedDeferred, Future)
+except ImportError:
+    DEFERRED_TYPES = (Deferred, MappedDeferred)
+
+def registerDeferredType(cls):
+    ''' let instances of cls be deferred values, cls has result() and done() methods
+    '''
+    global DEFERRED_TYPES
+    if not issubclass(cls, DEFERRED_TYPES):
+        DEFERRED_TYPES += (cls,)
+
+def isDeferred(obj):
+    return isinstance(obj, DEFERRED_TYPES)
+
+def resolve(fragments):
+    ''' fragments with deferred values replaced by their results
+    '''
+    res = []
+    for s in fragments:
+        if isDeferred(s):
+            value = s.result()
+            if hasattr(value, '__iter__'):
+                res.extend(resolve(value))
+            else:
+                res.append(value)
+        else:
+            res.append(s)
+    return res
@@ -0,0 +1,134 @@
+'''
+Escaping of text for autoescape mode of templates.
+
+Text of template is markup, values of render context and results of m*
+methods are text, they are escaped once, when they get into the output.
+Escaped text is carried as Safe (Escaped for escaped text), so it is
+neither escaped nor scanned again when it is passed on.
+
+Methods get parameters made only of values as plain text, so they can
+measure and transform it and their result is escaped once. Parameters
+containing markup of template are Safe, string methods of Safe keep it
+safe, and methods can return Safe to keep markup in their result.
+'''
+
+import re
+
+from mrkev.deferred import MappedDeferred, isDeferred
+
+SPECIAL_RE = re.compile(u'[&<>"\']')
+ENTITIES = {
+    u'&': u'&amp;',
+    u'<': u'&lt;',
+    u'>': u'&gt;',
+    u'"': u'&quot;',
+    u"'": u'&#39;',
+}
+SPECIALS = dict((v, k) for k, v in ENTITIES.items())
+ENTITY_RE = re.compile(u'|'.join(SPECIALS))
+NUMBERS = (int, long, float, bool)
+
+class Safe(unicode):
+    ''' text which is already escaped
+
+    strings added to it are escaped, so the result stays safe
+    '''
+    __slots__ = ()
+
+    def __html__(self):
+        return self
+
+    def __add__(self, other):
+        return Safe(unicode.__add__(self, escape(other)))
+
+    def __radd__(self, other):
+        return Safe(unicode.__add__(escape(other), self))
+
+    def __mod__(self, args):
+        if isinstance(args, tuple):
+            args = tuple(escape(a) for a in args)
+        elif isinstance(args, dict):
+            args = dict((k, escape(v)) for k, v in args.items())
+        else:
+            args = escape(args)
+        return Safe(unicode.__mod__(self, args))
+
+    def join(self, strings):
+        return Safe(unicode.join(self, [escape(s) for s in strings]))
+
+    def replace(self, old, new, count=-1):
+        return Safe(unicode.replace(self, escape(old), escape(new), count))
+
+def keepSafe(method):
+    def wrapper(self, *args):
+        return Safe(method(self, *args))
+    wrapper.__name__ = method.__name__
+    return wrapper
+
+for name in ['capitalize', 'lower', 'upper', 'swapcase', 'title', 'strip', 'lstrip', 'rstrip',
+        'center', 'ljust', 'rjust', 'expandtabs', '__getitem__', '__getslice__', '__mul__', '__rmul__']:
+    setattr(Safe, name, keepSafe(getattr(unicode, name)))
+
+class Escaped(Safe):
+    ''' escaped text of a value, unescape() returns the text itself
+    '''
+    __slots__ = ()
+
+    def unescape(self):
+        text = unicode(self)
+        if u'&' not in text:
+            return text
+        return ENTITY_RE.sub(replaceSpecial, text)
+
+def escape(obj):
+    ''' obj as Safe text, special characters replaced by entities
+
+    text is scanned once, only text containing special characters is
+    replaced (again in one pass), numbers are kept as they are
+
+    unicode.translate with a dict is about twice slower than re.sub here
+    '''
+    t = type(obj)
+    if t is Escaped or t is Safe:
+        return obj
+    if t is not unicode:
+        if t in NUMBERS:
+            return obj
+        html = getattr(obj, '__html__', None)
+        if html is not None:
+            return Safe(html())
+        obj = unicode(obj)
+    if SPECIAL_RE.search(obj) is None:
+        return Escaped(obj)
+    return Escaped(SPECIAL_RE.sub(replaceEntity, obj))
+
+def replaceEntity(match):
+    return ENTITIES[match.group()]
+
+def replaceSpecial(match):
+    return SPECIALS[match.group()]
+
+def joinArgument(fragments):
+    ''' parameter of m* method from its rendered fragments
+
+    fragments made only of escaped values are joined as plain text, other
+    text is markup, so it is joined as Safe
+    '''
+    for s in fragments:
+        if isinstance(s, basestring) and type(s) is not Escaped:
+            return Safe(u''.join(unicode(s) for s in fragments))
+    if not fragments:
+        return Safe()
+    return u''.join(s.unescape() if type(s) is Escaped else unicode(s) for s in fragments)
+
+def escapeOutput(res, deferred=False):
+    ''' escaped result of a function, items of sequences are escaped one by one
+
+    with deferred (see Template.render_async) deferred values are escaped
+    when their result is read
+    '''
+    if deferred and isDeferred(res):
+        return MappedDeferred(res, escapeOutput)
+    if hasattr(res, '__iter__'):
+        return (escape(s) for s in res)
+    return escape(res)
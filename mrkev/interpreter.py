@@ -20,38 +20,130 @@ Examples:
 ]]
 '''
 
-from itertools import chain
-from collections import deque
+from itertools import chain, islice
+from collections import defaultdict, deque
+from types import GeneratorType
+import copy
 import inspect
 import re
 
+from mrkev.accessor import ACCESSORS, MISSING, Items, getAccessor, wrapValue
+from mrkev.batch import renderMany
+from mrkev.cache import FragmentCache, MemoryCache
+from mrkev.compiler import Compiler
+from mrkev.deferred import isDeferred, resolve
+from mrkev.escape import Safe, escape, escapeOutput, joinArgument
+from mrkev.memo import BlockMemo, ValueMemo
+from mrkev.optimizer import Optimizer
 from mrkev.parser import Parser
+from mrkev.profiler import RenderProfile
+from mrkev.resolver import GLOBAL, Resolver, iterNodes
+from mrkev.session import RenderSession
 from mrkev.translator import CallBlock, CallParameter, BlockDefinition, BlockScope, Translator, formParameterName
 
 class CustomContext(object):
-    def __init__(self, ip, d):
+    ''' names of d, names missing there are looked up in shared defaults
+
+    found blocks are kept unless they walk a path from value of a function
+    (e.g. $Item.url of List), such values can change on every lookup
+
+    values of d are escaped in autoescape mode, defaults are part of template
+
+    with valueMemo, callable values of d are loaded once and then read as
+    values, see mrkev.memo.ValueMemo; loaders of dotted names are called
+    when they are found, others when they are evaluated as blocks
+    '''
+    def __init__(self, ip, d, defaults=None, autoescape=False, valueMemo=None):
         self.d = d
+        self.defaults = defaults
         self.ip = ip
+        self.autoescape = autoescape
+        self.found = {}
+        self.valueMemo = valueMemo
+        self.values = {}
+        #pushed scope of only $ names (e.g. by List) shadows no blocks
+        self.blockNames = any(not name.startswith('$') for name in d)
 
     def get(self, name):
-        parts = name.split('.')
-        fname, dictPath = parts[0], parts[1:]
-        obj = self.d.get(fname)
-        if obj:
-            if dictPath and callable(obj):
+        res = self.found.get(name)
+        if res is not None:
+            return res
+        accessor = ACCESSORS.get(name) or getAccessor(name)
+        obj = self.d.get(accessor.head)
+        autoescape = self.autoescape
+        if obj is None and self.defaults is not None:
+            obj = self.defaults.get(accessor.head)
+            autoescape = False
+        elif self.valueMemo is not None and callable(obj):
+            #not kept in found, so every read is counted
+            if not accessor.path:
+                #called as block, in its call scope
+                return wrapValue(self.memoizedLoader(accessor.head, obj), autoescape)
+            obj = self.valueMemo.load(self.values, accessor.head, obj, self.ip)
+            if self.ip.deferred and isDeferred(obj):
+                obj = obj.result()
+            obj = accessor.walk(obj)
+            if obj is MISSING:
+                return None
+            return wrapValue(obj, autoescape, self.ip.deferred)
+        if not obj:
+            return None
+        if accessor.path:
+            if callable(obj):
                 obj = obj(self.ip)
-            dictPath.reverse()
-            while dictPath and obj:
-                if isinstance(obj, list) and len(obj) == 1:
-                    obj = obj[0]
-                if hasattr(obj, 'get'):
-                    obj = obj.get(dictPath.pop())
-                else:
+                if self.ip.deferred and isDeferred(obj):
+                    obj = obj.result()
+                obj = accessor.walk(obj)
+                if obj is MISSING:
                     return None
-            if not callable(obj):
-                return lambda ip: obj
-            return obj
-        return None
+                return wrapValue(obj, autoescape, self.ip.deferred)
+            if self.ip.deferred and isDeferred(obj):
+                #path is walked in the value itself
+                obj = obj.result()
+            obj = accessor.walk(obj)
+            if obj is MISSING:
+                return None
+        res = wrapValue(obj, autoescape, self.ip.deferred)
+        self.found[name] = res
+        return res
+
+    def memoizedLoader(self, name, loader):
+        return lambda ip: self.valueMemo.loadInCall(self.values, name, loader, ip)
+
+def shadowsBlocks(scope):
+    ''' scope pushed by template function can define blocks of the program
+    '''
+    if isinstance(scope, BlockScope):
+        return False
+    return not isinstance(scope, CustomContext) or scope.blockNames
+
+#markers of the evaluation stack
+LEAVE_CALL = object()
+REMOVE_BLOCK_SCOPE = object()
+
+class EvaluatedArgument(object):
+    ''' argument of memoized block evaluated before its call
+
+    names read by the argument can be shadowed by scopes the block pushes
+    (e.g. $Item of List), the argument is then evaluated again in place
+    '''
+    __slots__ = ('value', 'content', 'names', 'depth')
+
+    def __init__(self, value, content, names, depth):
+        self.value = value
+        self.content = content
+        self.names = names
+        self.depth = depth
+
+    def __call__(self, ip):
+        pushed = len(ip.blockScopes) - self.depth
+        if pushed > 0:
+            for scope in islice(ip.blockScopes, 0, pushed):
+                if shadowsBlocks(scope) or any(scope.get(name) is not None for name in self.names):
+                    ip.shadowedArguments += 1
+                    return ip.eval(self.content)
+            ip.nestedArguments += 1
+        return list(self.value)
 
 class ErrorFormatter(object):
     def formatBlockMissing(self, name):
@@ -74,37 +166,115 @@ class ErrorBlock(object):
         '''
         return False
 
+    def __eq__(self, other):
+        return isinstance(other, ErrorBlock) and self.msg == other.msg
+
+    def __ne__(self, other):
+        return not self == other
+
 class Interpreter(object):
     #greater limit than python stack size will lead to exceptions
     RECURRENCE_LIMIT = 30
 
-    def __init__(self, ast, errorFormatter=None):
+    def __init__(self, ast, errorFormatter=None, memo=None):
         self.ast = ast
         self.useCount = 0
         self.errorFormatter = errorFormatter or ErrorFormatter()
         self.currentLexicalScope = None
         self.blockScopes = deque()
+        self.globalScopes = []
+        #scopes pushed by template functions which can define any block
+        self.pushedScopes = 0
         self.callScopes = deque()
+        #calls of every definition by its slot, see mrkev.resolver
+        self.frames = defaultdict(list)
+        #memoized blocks, see mrkev.memo
+        self.memo = memo
+        self.memoEntries = {}
+        self.recurrenceLimits = 0
+        #arguments of memoized blocks evaluated again or read in scopes
+        #pushed by the block, see EvaluatedArgument
+        self.shadowedArguments = 0
+        self.nestedArguments = 0
+        #scope depth and $ values read by memoized blocks being rendered
+        self.readRecorders = []
+        #values of render context are escaped, see mrkev.escape
+        self.autoescape = False
+        #time spent in blocks, see mrkev.profiler
+        self.profile = None
+        #deferred values can be part of output, see mrkev.deferred
+        self.deferred = False
+        #depth of evaluations by iterEval
+        self.nesting = 0
 
     def evalToString(self):
-        return ''.join(unicode(s) for s in self.eval(self.ast))
+        res = self.eval(self.ast)
+        if self.deferred:
+            #whole template is evaluated, all deferred values are being fetched
+            res = resolve(res)
+        return ''.join(unicode(s) for s in res)
+
+    def iterString(self, bufferSize=0):
+        ''' yield output while it is evaluated
+
+        fragments are joined into chunks of at least bufferSize characters
+        '''
+        chunk = []
+        size = 0
+        for s in self.iterEval(self.ast):
+            s = unicode(s)
+            chunk.append(s)
+            size += len(s)
+            if size >= bufferSize:
+                yield ''.join(chunk)
+                chunk = []
+                size = 0
+        if chunk:
+            yield ''.join(chunk)
 
     def findBlock(self, block):
-        for c in self.blockScopes:
-            value = c.get(block.name)
-            if value is not None:
-                return value
-        return None
+        binding = block.binding
+        if binding is None or self.pushedScopes:
+            #scopes pushed by template functions can define any name
+            scopes = self.blockScopes
+        elif binding is GLOBAL:
+            scopes = self.globalScopes
+        else:
+            return binding
+        res = None
+        for c in scopes:
+            res = c.get(block.name)
+            if res is not None:
+                break
+        if res is None and isinstance(binding, BlockDefinition):
+            res = binding
+        if scopes is self.blockScopes and self.readRecorders and not block.name.startswith('$'):
+            #definition found by dynamic scoping is input of memoized blocks
+            self.recordRead(block.name, res)
+        return res
 
     def findParameter(self, block):
+        if block.slot is None:
+            callBlock = self.findCall(block.lexicalScope)
+        else:
+            calls = self.frames.get(block.slot)
+            callBlock = calls[-1] if calls else None
+        if callBlock is None:
+            return None
+        #get last calling of the same block
+        if block.inDefaultParameter:
+            #prevents call cycles in default parameters
+            return callBlock.get(block.name)
+        elif block.lexicalScope is None:
+            #parameters outside of definitions, e.g. evaluated in call of function
+            return callBlock.get(block.name)
+        else:
+            return  callBlock.get(block.name) or block.lexicalScope.get(block.name)
+
+    def findCall(self, blockDefinition):
         for callBlock, blockDef in self.callScopes:
-            if blockDef is block.lexicalScope:
-                #get last calling of the same block
-                if block.inDefaultParameter:
-                    #prevents call cycles in default parameters
-                    return callBlock.get(block.name)
-                else:
-                    return  callBlock.get(block.name) or block.lexicalScope.get(block.name)
+            if blockDef is blockDefinition:
+                return callBlock
         return None
 
     def eval(self, block):
@@ -120,62 +290,292 @@ class Interpreter(object):
             res = self.evalCallBlock(block)
 
         elif isinstance(block, CallParameter):
-            blocks = self.findParameter(block)
-            if not blocks:
-                msg = self.errorFormatter.formatBlockMissing(block.name)
-                return [ErrorBlock(msg)]
-            res = self.eval(blocks)
+            res = self.evalParameter(block)
 
         elif isinstance(block, BlockScope):
-            self.addBlockScope(block)
-            res = self.eval(block.content)
-            self.removeBlockScope()
+            res = self.evalBlockScope(block)
 
         else:
-            res = block(self)
-            if not hasattr(res, '__iter__'):
-                res = [res]
+            res = self.evalCallable(block)
+
+        return res
+
+    def evalParameter(self, block):
+        blocks = self.findParameter(block)
+        if not blocks:
+            msg = self.errorFormatter.formatBlockMissing(block.name)
+            return [ErrorBlock(msg)]
+        return self.eval(blocks)
+
+    def evalBlockScope(self, block):
+        self.addBlockScope(block)
+        res = self.eval(block.content)
+        self.removeBlockScope()
+        return res
 
+    def evalCallable(self, block):
+        res = block(self)
+        if isinstance(res, GeneratorType):
+            #generator has to finish before its call scope is left
+            res = list(res)
+        elif not hasattr(res, '__iter__'):
+            res = [res]
         return res
 
     def evalCallBlock(self, block):
+        if self.memo is not None and block.name in self.memo.names:
+            return self.evalMemoized(block)
+        content, error = self.enterCallBlock(block)
+        if error:
+            res = error
+        else:
+            res = self.eval(content)
+            self.leaveCallBlock()
+        if self.readRecorders and block.name.startswith('$'):
+            self.recordRead(block.name, list(res))
+        return res
+
+    def evalMemoized(self, block):
+        blockDef = self.findBlock(block)
+        if not isinstance(blockDef, BlockDefinition) or self.useCount >= self.RECURRENCE_LIMIT:
+            return self.evalUnmemoized(block)
+        #arguments are evaluated once, before the call (they can call the block
+        #again), but they see definitions of the block as its parameters do
+        self.useCount += 1
+        scopes = self.addDefinitionScopes(blockDef.content)
+        self.readRecorders.append((len(self.blockScopes), {}))
+        try:
+            args = dict((name, self.eval(value)) for name, value in block.params.items())
+        finally:
+            names = frozenset(self.readRecorders.pop()[1])
+            for _ in range(scopes):
+                self.removeBlockScope()
+            self.useCount -= 1
+        #fragments are kept apart, List reads them one by one
+        key = (blockDef, tuple(sorted((name, tuple(unicode(s) for s in value)) for name, value in args.items())))
+        res = self.memo.lookup(self, key, names)
+        if res is None:
+            #block is rendered from the same evaluated arguments
+            call = CallBlock(block.name, block.span)
+            call.binding = blockDef
+            depth = len(self.blockScopes) + scopes
+            for name, value in args.items():
+                call.addParam(name, [EvaluatedArgument(value, block.params[name], names, depth)])
+            limits = self.recurrenceLimits
+            shadowed = self.shadowedArguments
+            nested = self.nestedArguments
+            self.readRecorders.append((len(self.blockScopes), {}))
+            try:
+                res = list(self.evalUnmemoized(call))
+            finally:
+                reads = self.readRecorders.pop()[1]
+            #output cut by recurrence limit depends on depth of the call,
+            #output of shadowed arguments does not match the key, arguments
+            #read in scopes of the block are reused only by the same names
+            if self.recurrenceLimits == limits and self.shadowedArguments == shadowed:
+                self.memo.add(self, key, res, reads, names if self.nestedArguments != nested else None)
+        return list(res)
+
+    def addDefinitionScopes(self, content):
+        ''' push scopes of definitions the content starts with, returns their count
+        '''
+        count = 0
+        while True:
+            while isinstance(content, list) and len(content) == 1:
+                content = content[0]
+            if not isinstance(content, BlockScope):
+                return count
+            self.addBlockScope(content)
+            count += 1
+            content = content.content
+
+    def evalUnmemoized(self, block):
+        content, error = self.enterCallBlock(block)
+        if error:
+            return error
+        res = self.eval(content)
+        self.leaveCallBlock()
+        return res
+
+    def evalText(self, block):
+        return ''.join(unicode(s) for s in self.eval(block))
+
+    def recordRead(self, name, value):
+        #values pushed inside of the block (e.g. by List) are not its inputs
+        depth = 0
+        for i, scope in enumerate(self.blockScopes):
+            if scope.get(name) is not None:
+                depth = len(self.blockScopes) - i
+                break
+        for scopes, reads in self.readRecorders:
+            if depth <= scopes:
+                reads.setdefault(name, value)
+
+    def readValue(self, name):
+        ''' current output of $ value or definition found for block name,
+        memoized output is valid while it stays same
+        '''
+        if not name.startswith('$'):
+            return self.findBlock(CallBlock(name))
+        return list(self.evalCallBlock(CallBlock(name)))
+
+    def enterCallBlock(self, block):
+        ''' find called block and push its call scope
+
+        returns content to evaluate and error which replaces the output
+        '''
         name = block.name
         blockDef = self.findBlock(block)
         if not blockDef:
             msg = self.errorFormatter.formatBlockMissing(name)
-            return [ErrorBlock(msg)]
+            return None, [ErrorBlock(msg)]
 
         self.useCount += 1
         if self.useCount > self.RECURRENCE_LIMIT:
-            return self.createRecurrenceLimit(name)
+            return None, self.createRecurrenceLimit(name)
 
         if isinstance(blockDef, BlockDefinition):
             self.addCallScope(block, blockDef)
-            res = self.eval(blockDef.content)
-            self.removeCallScope()
+            return blockDef.content, None
         else:
             self.addCallScope(block, None)
-            res = self.eval(blockDef)
-            self.removeCallScope()
+            return blockDef, None
 
+    def leaveCallBlock(self):
+        self.removeCallScope()
         self.useCount -= 1
+
+    def iterEval(self, block):
+        ''' same as eval, but yields fragments as soon as they are evaluated
+
+        nested blocks are kept on explicit stack, see evalStep
+        '''
+        stack = [block]
+        self.nesting += 1
+        try:
+            while stack:
+                output = self.evalStep(stack.pop(), stack)
+                if output:
+                    for s in output:
+                        yield s
+        finally:
+            self.nesting -= 1
+            self.unwindStack(stack)
+
+    def evalStep(self, block, stack):
+        ''' evaluate item taken from the evaluation stack
+
+        nested blocks are pushed to the stack (followed by markers leaving
+        their scopes), returns output of the item or None
+        '''
+        #exact types first, isinstance is slow for the most common nodes
+        t = type(block)
+        if t is unicode or t is str:
+            return (block,)
+
+        elif t is list:
+            stack.extend(reversed(block))
+
+        elif t is CallParameter:
+            blocks = self.findParameter(block)
+            if not blocks:
+                return [ErrorBlock(self.errorFormatter.formatBlockMissing(block.name))]
+            stack.append(blocks)
+
+        elif block is LEAVE_CALL:
+            self.leaveCallBlock()
+
+        elif t is CallBlock:
+            #profiled and memoized calls are measured or stored as a whole,
+            #consumer of iterEval runs between items, so the state is read for every call
+            if self.readRecorders or self.profile is not None or (self.memo is not None and block.name in self.memo.names):
+                return self.checkNesting(block) or self.evalCallBlock(block)
+            return self.pushCallBlock(block, stack)
+
+        elif t is BlockScope:
+            self.addBlockScope(block)
+            stack.append(REMOVE_BLOCK_SCOPE)
+            stack.append(block.content)
+
+        elif block is REMOVE_BLOCK_SCOPE:
+            self.removeBlockScope()
+
+        elif isinstance(block, basestring):
+            return (block,)
+
+        elif isinstance(block, list):
+            stack.extend(reversed(block))
+
+        else:
+            res = block(self)
+            if not hasattr(res, '__iter__'):
+                return (res,)
+            return res
+        return None
+
+    def pushCallBlock(self, block, stack):
+        ''' push content of called block followed by LEAVE_CALL to stack
+
+        functions of the render context are called right away, their output
+        is returned and produced before LEAVE_CALL is taken from the stack,
+        returns error or None when the content was pushed
+        '''
+        content, error = self.enterCallBlock(block)
+        if error:
+            return error
+        stack.append(LEAVE_CALL)
+        if not callable(content):
+            stack.append(content)
+            return None
+        res = self.checkNesting(block) or content(self)
+        if not hasattr(res, '__iter__'):
+            return (res,)
         return res
 
+    def checkNesting(self, block):
+        ''' returns error when call of block cannot be evaluated nested
+        '''
+        return None
+
+    def unwindStack(self, stack):
+        ''' leave scopes of evaluation stopped by consumer or by an exception
+        '''
+        while stack:
+            block = stack.pop()
+            if block is LEAVE_CALL:
+                self.leaveCallBlock()
+            elif block is REMOVE_BLOCK_SCOPE:
+                self.removeBlockScope()
+
     def createRecurrenceLimit(self, name):
+        self.recurrenceLimits += 1
         msg = self.errorFormatter.formatRecurrenceLimit(name, self.RECURRENCE_LIMIT)
         return [ErrorBlock(msg)]
 
     def addBlockScope(self, blockScope):
+        if shadowsBlocks(blockScope):
+            self.pushedScopes += 1
         self.blockScopes.appendleft(blockScope)
 
     def removeBlockScope(self):
-        self.blockScopes.popleft()
+        if shadowsBlocks(self.blockScopes.popleft()):
+            self.pushedScopes -= 1
+
+    def addGlobalScope(self, scope):
+        ''' add scope under all others, e.g. render context
+        '''
+        self.blockScopes.append(scope)
+        self.globalScopes.append(scope)
 
     def addCallScope(self, blockCall, blockDefinition):
         self.callScopes.appendleft((blockCall, blockDefinition))
+        slot = blockDefinition.slot if blockDefinition is not None else 0
+        self.frames[slot].append(blockCall)
 
     def removeCallScope(self):
-        self.callScopes.popleft()
+        blockCall, blockDefinition = self.callScopes.popleft()
+        slot = blockDefinition.slot if blockDefinition is not None else 0
+        self.frames[slot].pop()
 
     def getValue(self, name, ifMissing=None):
         res = self.eval(CallParameter(name, lexicalScope=None, inDefaultParameter=True))
@@ -183,8 +583,56 @@ class Interpreter(object):
             res = ifMissing
         return res
 
+    def getIterable(self, name):
+        ''' items of parameter, iterable value of the render context
+        (e.g. Seq=[[$rows]]) is returned as it is, without reading it
+        '''
+        content = self.findParameter(CallParameter(name, lexicalScope=None, inDefaultParameter=True))
+        while isinstance(content, list) and len(content) == 1:
+            content = content[0]
+        if isinstance(content, CallBlock):
+            blockDef = self.findBlock(content)
+            if isinstance(blockDef, Items):
+                if self.readRecorders:
+                    #read of memoized block is recorded by evalCallBlock,
+                    #so the sequence has to be read before
+                    blockDef.items = list(blockDef.items)
+                    self.evalCallBlock(content)
+                return blockDef.items
+        return self.getFragments(name)
+
+    def getFragments(self, name):
+        ''' rendered fragments of parameter, not joined into one string
+        '''
+        res = self.getValue(name, [])
+        if self.deferred:
+            #items are read, deferred ones are waited for
+            res = resolve(res)
+        if self.autoescape:
+            #rendered items are markup, escaped values (e.g. folded by specialize) stay values
+            res = [Safe(s) if isinstance(s, basestring) and not isinstance(s, Safe) else s for s in res]
+        return res
+
     def getString(self, name):
-        return ''.join(unicode(s) for s in self.getValue(name, []))
+        res = self.getValue(name, [])
+        if self.deferred:
+            res = resolve(res)
+        res = ''.join(unicode(s) for s in res)
+        if self.autoescape:
+            #rendered text is markup, it is not escaped again
+            return Safe(res)
+        return res
+
+    def getArgument(self, name):
+        ''' string of m* method parameter, parameter made only of values of
+        the render context is given unescaped, see mrkev.escape.joinArgument
+        '''
+        if not self.autoescape:
+            return self.getString(name)
+        res = self.getValue(name, [])
+        if self.deferred:
+            res = resolve(res)
+        return joinArgument(res)
 
     def getBoolean(self, name):
         '''convert block to boolean
@@ -192,6 +640,8 @@ class Interpreter(object):
         unknown or empty -> False
         '''
         res = self.getValue(name)
+        if self.deferred:
+            res = resolve(res)
         return len(res) > 0 and all(res)
 
     def getGetLastCallParameters(self):
@@ -200,15 +650,168 @@ class Interpreter(object):
         else:
             return []
 
+class CompiledInterpreter(Interpreter):
+    ''' interpreter running nodes compiled by mrkev.compiler.Compiler
+    '''
+    def __init__(self, ast, code, errorFormatter=None, memo=None):
+        super(CompiledInterpreter, self).__init__(ast, errorFormatter=errorFormatter, memo=memo)
+        self.code = code
+
+    def eval(self, block):
+        f = self.code.get(id(block))
+        if f is None:
+            return super(CompiledInterpreter, self).eval(block)
+        return f(self)
+
+class StackInterpreter(Interpreter):
+    ''' interpreter evaluating nested blocks on its own stack
+
+    depth of block calls is not limited by python stack, only functions of
+    the render context (e.g. If, List) and memoized blocks are evaluated by
+    nested evaluation, so their depth has its own limit
+
+    Template.RECURRENCE_LIMIT overrides the limit of block calls, profiled
+    renders evaluate every call nested, so NESTING_LIMIT applies to them
+    '''
+    RECURRENCE_LIMIT = 1000
+    #every nested evaluation takes about 6 python frames
+    NESTING_LIMIT = 100
+
+    def eval(self, block):
+        t = type(block)
+        #parameters passed on by parameters (e.g. href=#Target) and single
+        #strings are resolved without setting up the stack
+        while t is CallParameter:
+            blocks = self.findParameter(block)
+            if not blocks:
+                return [ErrorBlock(self.errorFormatter.formatBlockMissing(block.name))]
+            block = blocks
+            t = type(block)
+            if t is list and len(block) == 1:
+                block = block[0]
+                t = type(block)
+        if t is unicode or t is str:
+            return [block]
+        #same loop as iterEval without a generator, template functions
+        #evaluate their parameters by eval many times
+        res = []
+        append = res.append
+        stack = [block]
+        pop = stack.pop
+        step = self.evalStep
+        self.nesting += 1
+        try:
+            while stack:
+                block = pop()
+                t = type(block)
+                if t is unicode or t is str:
+                    append(block)
+                    continue
+                output = step(block, stack)
+                if output:
+                    res.extend(output)
+        finally:
+            self.nesting -= 1
+            self.unwindStack(stack)
+        return res
+
+    def checkNesting(self, block):
+        #functions of the render context evaluate their parameters nested
+        if self.nesting > self.NESTING_LIMIT:
+            return self.createRecurrenceLimit(block.name)
+        return None
+
 class MethodWrapper(object):
-    def __init__(self, f):
+    ''' calls m* method with its parameters read as strings
+
+    lazy methods get LazyArgument proxies, raw methods get lists of rendered
+    fragments instead of strings
+    '''
+    def __init__(self, f, autoescape=False, lazy=False, raw=False):
         self.args = [n for n in inspect.getargspec(f).args if n != 'self']
+        formName = lambda a: formParameterName(a) if a != 'content' else '#'
+        self.params = [(a, formName(a)) for a in self.args]
         self.f = f
+        self.autoescape = autoescape
+        self.lazy = lazy
+        self.raw = raw
 
     def __call__(self, ip):
-        formName = lambda a: formParameterName(a) if a != 'content' else '#'
-        params = dict((a, ip.getString(formName(a))) for a in self.args)
-        return self.f(**params)
+        if self.lazy:
+            res = self.callLazy(ip)
+        else:
+            read = ip.getFragments if self.raw else ip.getArgument
+            params = dict((a, read(name)) for a, name in self.params)
+            res = self.f(**params)
+        if self.autoescape:
+            return escapeOutput(res, ip.deferred)
+        return res
+
+    def callLazy(self, ip):
+        params = dict((a, LazyArgument(ip, name, self.raw)) for a, name in self.params)
+        res = self.f(**params)
+        #arguments can be read only while the call is evaluated
+        if isinstance(res, LazyArgument):
+            return res.get()
+        if isinstance(res, (list, tuple)):
+            return [r.get() if isinstance(r, LazyArgument) else r for r in res]
+        return res
+
+class LazyArgument(object):
+    ''' parameter of m* method rendered when its value is read first
+
+    it stands for the value (string or list of fragments in raw mode) in
+    common operations, get() returns the value itself
+    '''
+    __slots__ = ('ip', 'name', 'raw', 'value')
+
+    def __init__(self, ip, name, raw=False):
+        self.ip = ip
+        self.name = name
+        self.raw = raw
+        self.value = MISSING
+
+    def get(self):
+        if self.value is MISSING:
+            self.value = self.ip.getFragments(self.name) if self.raw else self.ip.getArgument(self.name)
+        return self.value
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+    def __unicode__(self):
+        value = self.get()
+        return u''.join(unicode(s) for s in value) if self.raw else value
+
+    __str__ = __unicode__
+
+    def __nonzero__(self):
+        return bool(self.get())
+
+    def __len__(self):
+        return len(self.get())
+
+    def __iter__(self):
+        return iter(self.get())
+
+    def __contains__(self, item):
+        return item in self.get()
+
+    def __eq__(self, other):
+        return self.get() == other
+
+    def __ne__(self, other):
+        return self.get() != other
+
+    def __hash__(self):
+        #fragments of raw mode are not hashable, as any list
+        return hash(self.get())
+
+    def __add__(self, other):
+        return self.get() + other
+
+    def __radd__(self, other):
+        return other + self.get()
 
 class Template(object):
     ''' object for rendering markup which can be extended about parameters and functions
@@ -220,35 +823,237 @@ class Template(object):
     def mHello(self, name):
         return 'Hello ' + name
     '''
-    def __init__(self, code, errorFormatter=None):
-        if isinstance(code, basestring):
-            code = Parser(code).parse()
-        code = Translator().translate(code)
-        self.interpreter = Interpreter(code, errorFormatter=errorFormatter)
+    #names of render context whose output depends only on their parameters
+    PURE_NAMES = frozenset(['(', ')', 'Sp', 'If', 'Split', 'html'])
+    #names of template blocks whose output depends only on arguments and $ values
+    MEMOIZED_BLOCKS = ()
+    #outputs kept by one rendering and by LRU cache shared by renderings (0 disables it)
+    RENDER_MEMO_SIZE = 1000
+    SHARED_MEMO_SIZE = 0
+    #fragments kept by default backend of [Cache]
+    FRAGMENT_CACHE_SIZE = 1000
+    #depth of block calls, None keeps the limit of interpreter
+    RECURRENCE_LIMIT = None
+    #names of m* methods (without m) getting LazyArgument proxies or lists of fragments
+    LAZY_ARGUMENTS = ()
+    RAW_ARGUMENTS = ()
+    #$ names pushed by template functions, they are never treated as static
+    SCOPE_NAMES = frozenset(['$Even', '$First', '$Item', '$Last', '$Odd', '$Order'])
+    #names of render context pushing no names other than SCOPE_NAMES (m* methods
+    #push none), calls in arguments of other functions are not folded
+    SCOPE_FREE_NAMES = frozenset(['(', ')', 'Sp', 'Cache', 'If', 'List', 'Split', 'html'])
+
+    def __init__(self, code, errorFormatter=None, compiled=False, translated=False, optimized=False,
+            cacheBackend=None, iterative=False, autoescape=False, memoizeValues=False):
+        ''' code is source text, parsed blocks or, when translated is set,
+        program already produced by Translator (e.g. loaded from ProgramCache)
+
+        options are described by modules implementing them: compiled
+        (mrkev.compiler), optimized (mrkev.optimizer), cacheBackend
+        (mrkev.cache), iterative (StackInterpreter), autoescape (mrkev.escape)
+        and memoizeValues (mrkev.memo)
+        '''
+        if compiled and iterative:
+            raise ValueError('compiled template can not be iterative')
+        if not translated:
+            if isinstance(code, basestring):
+                code = Parser(code).parse()
+            code = Translator().translate(code)
+        Resolver().resolve(code)
+        self.errorFormatter = errorFormatter
+        if cacheBackend is None:
+            cacheBackend = MemoryCache(self.FRAGMENT_CACHE_SIZE)
+        self.fragmentCache = FragmentCache(cacheBackend)
+        self.builtins = None
+        self.iterative = iterative
+        self.autoescape = autoescape
+        self.valueMemo = ValueMemo() if memoizeValues else None
+        #parameters given to specialize, passed to every render
+        self.staticParams = {}
+        self.optimizerStatistics = None
+        if optimized:
+            optimizer = Optimizer(self.evaluateConstant, self.PURE_NAMES, scopeFreeNames=self._getScopeFreeNames())
+            code = optimizer.optimize(code)
+            self.optimizerStatistics = optimizer.getStatistics()
+        self.program = code
+        if compiled:
+            self.code = Compiler(self.MEMOIZED_BLOCKS).compile(self.program)
+        else:
+            self.code = None
+        if self.MEMOIZED_BLOCKS:
+            self.memo = BlockMemo(self.MEMOIZED_BLOCKS, self.RENDER_MEMO_SIZE, self.SHARED_MEMO_SIZE)
+        else:
+            self.memo = None
+
+    def __getstate__(self):
+        ''' pickled template (e.g. sent to workers of render_many) keeps its
+        program and attributes, names, caches and compiled code are built again
+        '''
+        state = dict(self.__dict__)
+        for name in ('builtins', 'fragmentCache', 'memo', 'valueMemo', 'code'):
+            del state[name]
+        state['compiled'] = self.code is not None
+        state['memoizeValues'] = self.valueMemo is not None
+        return state
+
+    def __setstate__(self, state):
+        state = dict(state)
+        compiled = state.pop('compiled')
+        memoizeValues = state.pop('memoizeValues')
+        self.__dict__.update(state)
+        self.builtins = None
+        self.fragmentCache = FragmentCache(MemoryCache(self.FRAGMENT_CACHE_SIZE))
+        self.valueMemo = ValueMemo() if memoizeValues else None
+        if self.MEMOIZED_BLOCKS:
+            self.memo = BlockMemo(self.MEMOIZED_BLOCKS, self.RENDER_MEMO_SIZE, self.SHARED_MEMO_SIZE)
+        else:
+            self.memo = None
+        #nodes of the unpickled program are new objects
+        self.code = Compiler(self.MEMOIZED_BLOCKS).compile(self.program) if compiled else None
+
+    def __copy__(self):
+        #copies (e.g. specialize) share names and caches of the template
+        template = self.__class__.__new__(self.__class__)
+        template.__dict__.update(self.__dict__)
+        return template
+
+    #minimal size of chunks produced by render_iter
+    STREAM_BUFFER_SIZE = 4096
+    #encoding of chunks written by render_to, None writes unicode
+    STREAM_ENCODING = 'utf-8'
 
     def render(self, **kwargs):
-        context = self.createContext(kwargs)
-        self.interpreter.addBlockScope(context)
-        return self.interpreter.evalToString()
+        return self.createInterpreter(kwargs).evalToString()
 
-    def createContext(self, params):
-        builtins = {}
-        builtins.update(self._getParameters(params))
-        builtins.update(self._getTemplateFunctions())
-        builtins.update(self._getStringBasedMethods())
-        return CustomContext(self.interpreter, builtins)
+    def render_iter(self, **kwargs):
+        ''' generator of rendered output chunks
+        '''
+        return self.createInterpreter(kwargs).iterString(self.STREAM_BUFFER_SIZE)
 
-    def _getParameters(self, params):
-        params = dict(('$'+k, v) for k, v in params.items())
-        params.update({
+    def render_to(*args, **kwargs):
+        ''' render_to(fileobj, **kwargs)
+
+        write rendered output into file object as it is produced, fileobj
+        is taken only by position, so any name can be a parameter
+
+        chunks are written encoded by STREAM_ENCODING (e.g. to file opened in
+        binary mode or WSGI stream)
+        '''
+        self, fileobj = args
+        encoding = self.STREAM_ENCODING
+        for chunk in self.createInterpreter(kwargs).iterString(self.STREAM_BUFFER_SIZE):
+            if encoding is not None:
+                chunk = chunk.encode(encoding)
+            fileobj.write(chunk)
+
+    def render_async(self, **kwargs):
+        ''' render where values of the render context, m* methods and template
+        functions can return deferred values fetched concurrently, see mrkev.deferred
+        '''
+        ip = self.createInterpreter(kwargs)
+        ip.deferred = True
+        return ip.evalToString()
+
+    def render_many(self, params, workers=None, chunksize=16, ordered=True):
+        ''' outputs of render for every dict of params, rendered by worker
+        processes in chunks of chunksize items, see mrkev.batch
+        '''
+        return renderMany(self, params, workers, chunksize, ordered)
+
+    def session(self):
+        ''' RenderSession reusing output of fragments between renders, see mrkev.session
+        '''
+        return RenderSession(self)
+
+    def render_profile(self, **kwargs):
+        ''' rendered output and RenderProfile of its blocks, see mrkev.profiler
+        '''
+        ip = self.createInterpreter(kwargs)
+        profile = RenderProfile()
+        profile.attach(ip)
+        return ip.evalToString(), profile
+
+    def createInterpreter(self, params):
+        ''' create execution state for one rendering
+
+        template keeps only the translated program, so one template can be
+        rendered from more threads at once
+        '''
+        if self.code is not None:
+            ip = CompiledInterpreter(self.program, self.code, errorFormatter=self.errorFormatter, memo=self.memo)
+        elif self.iterative:
+            ip = StackInterpreter(self.program, errorFormatter=self.errorFormatter, memo=self.memo)
+        else:
+            ip = Interpreter(self.program, errorFormatter=self.errorFormatter, memo=self.memo)
+        if self.RECURRENCE_LIMIT is not None:
+            ip.RECURRENCE_LIMIT = self.RECURRENCE_LIMIT
+        ip.autoescape = self.autoescape
+        ip.addGlobalScope(self.createContext(ip, params))
+        return ip
+
+    def evaluateConstant(self, block):
+        ''' render block which does not depend on parameters of rendering
+        '''
+        ip = Interpreter(block, errorFormatter=self.errorFormatter)
+        ip.autoescape = self.autoescape
+        ip.addGlobalScope(self.createContext(ip, {}))
+        return ip.eval(block)
+
+    def specialize(self, **kwargs):
+        ''' template rendering as this one with kwargs given to every render
+
+        blocks depending only on kwargs (and constants) are rendered in
+        advance; blocks reading other parameters, $ names of template
+        functions, m* methods or callable values stay in the program
+
+        names of kwargs are fixed, passing them to render or specialize of
+        the returned template raises ValueError
+        '''
+        fixed = [k for k in kwargs if k in self.staticParams]
+        if fixed:
+            raise ValueError('parameters %s are already fixed' % ', '.join(sorted(fixed)))
+        program = copy.deepcopy(self.program)
+        definedNames = set(name for node in iterNodes(program) if isinstance(node, BlockScope) for name in node.params)
+        staticNames = frozenset('$' + k for k, v in kwargs.items() if not callable(v) and not isDeferred(v)
+            and '$' + k not in self.SCOPE_NAMES and '$' + k not in definedNames)
+        template = copy.copy(self)
+        template.staticParams = dict(self.staticParams, **kwargs)
+        optimizer = Optimizer(template.evaluateConstant, self.PURE_NAMES, staticNames, self._getScopeFreeNames())
+        template.program = optimizer.optimize(program)
+        template.optimizerStatistics = optimizer.getStatistics()
+        if self.code is not None:
+            template.code = Compiler(self.MEMOIZED_BLOCKS).compile(template.program)
+        return template
+
+    def createContext(self, ip, params):
+        if self.builtins is None:
+            self.builtins = self._getBuiltins()
+        if self.staticParams:
+            #folded blocks show the static values
+            fixed = [k for k in params if k in self.staticParams]
+            if fixed:
+                raise ValueError('parameters %s are fixed by specialize' % ', '.join(sorted(fixed)))
+            params = dict(self.staticParams, **params)
+        return CustomContext(ip, self._getParameters(params), self.builtins, ip.autoescape, self.valueMemo)
+
+    def _getBuiltins(self):
+        ''' names shared by all renderings, built on the first one
+        '''
+        builtins = {
             '(': u'[',
             ')': u']',
             'Sp': u' ',
-        })
-        return params
+        }
+        builtins.update(self._getTemplateFunctions())
+        builtins.update(self._getStringBasedMethods())
+        return builtins
+
+    def _getParameters(self, params):
+        return dict(('$'+k, v) for k, v in params.items())
 
     def _getTemplateFunctions(self):
         return {
+             'Cache': self.Cache,
              'If': self.If,
              'List': self.List,
              'Split': self.Split,
@@ -256,44 +1061,78 @@ class Template(object):
          }
 
     def _getStringBasedMethods(self):
-        #find all methods starting with m[A-Z].*
-        hasProperNameFormat = lambda k: len(k) > 2 and k[0] == 'm' and k[1].isupper()
         templateMethods = ((k[1:], getattr(self, k)) for k in dir(self) if callable(getattr(self, k)) and hasProperNameFormat(k))
-        return dict((name, MethodWrapper(method)) for name, method in templateMethods)
+        return dict((name, MethodWrapper(method, self.autoescape, name in self.LAZY_ARGUMENTS, name in self.RAW_ARGUMENTS))
+            for name, method in templateMethods)
+
+    def _getScopeFreeNames(self):
+        methods = (k[1:] for k in dir(self) if hasProperNameFormat(k) and callable(getattr(self, k)))
+        return self.SCOPE_FREE_NAMES | frozenset(methods)
 
     def List(self, ip):
-        seq = ip.getValue('#Seq', [])
+        items = iter(ip.getIterable('#Seq'))
         sep = ip.getString('#Sep')
-        if seq:
-            ip.addBlockScope(CustomContext(self.interpreter, {
-                #do not use for styling, css 2.0 is powerfull enough
-                '$Even':  lambda _: i % 2 == 1,
-                '$First': lambda _: i == 0,
-                '$Item':  lambda _: x,
-                '$Last':  lambda _: i+1 == len(seq),
-                '$Odd':   lambda _: i % 2 == 0,
-                '$Order': lambda _: i+1,
-            }))
-            if sep:
-                res = []
-                for i, x in enumerate(seq):
-                    res.append(ip.getValue('#'))
-                    if i + 1 != len(seq):
-                        res.append(sep)
-            else:
-                res = [ip.getValue('#') for i, x in enumerate(seq)]
+        #sequence is read one item ahead, so the last item is known
+        following = next(items, MISSING)
+        if following is MISSING:
+            for s in ip.getValue('#IfEmpty', []):
+                yield s
+            return
+        i, x, last = 0, None, False
+        ip.addBlockScope(CustomContext(ip, {
+            #do not use for styling, css 2.0 is powerfull enough
+            '$Even':  lambda _: i % 2 == 1,
+            '$First': lambda _: i == 0,
+            '$Item':  lambda _: x,
+            '$Last':  lambda _: last,
+            '$Odd':   lambda _: i % 2 == 0,
+            '$Order': lambda _: i+1,
+        }, autoescape=ip.autoescape))
+        try:
+            #every iteration is passed on as soon as it is evaluated
+            while not last:
+                x = following
+                following = next(items, MISSING)
+                last = following is MISSING
+                if sep and i:
+                    yield sep
+                for s in ip.getValue('#'):
+                    yield s
+                i += 1
+        finally:
             ip.removeBlockScope()
-            return list(chain(*res))
-        else:
-            return ip.getValue('#IfEmpty', [])
 
     def Split(self, ip):
-        content = ip.getString('#')
-        sep = ip.getString('#Sep')
+        if ip.autoescape:
+            #text made only of values is split as plain text
+            content = ip.getArgument('#')
+            sep = ip.getArgument('#Sep')
+        else:
+            content = ip.getString('#')
+            sep = ip.getString('#Sep')
         if sep:
             res = content.split(sep)
         else:
             res = [content]
+        if ip.autoescape:
+            #pieces of values are escaped values again, pieces of markup stay markup
+            wrap = Safe if isinstance(content, Safe) else escape
+            res = [wrap(s) for s in res]
+        return res
+
+    def Cache(self, ip):
+        key = ip.getString('#Key')
+        if not key:
+            return ip.getValue('#', [])
+        ttl = ip.getString('#Ttl')
+        try:
+            ttl = float(ttl) if ttl else 0
+        except ValueError:
+            return '[Ttl "%s" invalid]' % ttl
+        res = self.fragmentCache.get(key)
+        if res is None:
+            res = ip.getString('#')
+            self.fragmentCache.set(key, res, ttl)
         return res
 
     def If(self, ip):
@@ -302,6 +1141,10 @@ class Template(object):
         else:
             return ip.getValue('#Else', [])
 
+def hasProperNameFormat(name):
+    #names of m* methods start with m[A-Z]
+    return len(name) > 2 and name[0] == 'm' and name[1].isupper()
+
 class TagGenerator:
     TAG_NAME_RE = re.compile(r'^[a-zA-Z0-9]+(:[a-zA-Z0-9]+)?$')
 
@@ -313,13 +1156,14 @@ class TagGenerator:
             attrList = [(a, ip.getString(a)) for a in attributes if a != '#']
             if '#' in attributes:
                 content = ip.getString('#')
-                return list(chain(('<', name, joinAttributes(attrList), '>'), content, ('</', name, '>')))
+                return u'<%s%s>%s</%s>' % (name, joinAttributes(attrList), content, name)
             else:
-                return ['<', name, joinAttributes(attrList), '/>']
+                return u'<%s%s/>' % (name, joinAttributes(attrList))
         return wrapper
 
 def joinAttributes(attributes):
-    return ''.join(' %s="%s"' % (a[1:], escapeHtml(v))
+    #values rendered in autoescape mode are already escaped
+    return ''.join(' %s="%s"' % (a[1:], v if isinstance(v, Safe) else escapeHtml(v))
         for a, v in attributes if v)
 
 def escapeHtml(s):
@@ -0,0 +1,120 @@
+'''
+Loads templates from a directory and keeps them translated in memory.
+
+Example:
+
+loader = TemplateLoader('templates', maxSize=200)
+loader.get('page.mrkev').render(title=u'New page')
+'''
+
+import hashlib
+import os
+import threading
+
+from mrkev.cache import LRUCache, ProgramCache
+from mrkev.interpreter import Template
+from mrkev.parser import Parser
+
+class TemplateNotFound(IOError):
+    pass
+
+class CacheEntry(object):
+    __slots__ = ('template', 'mtime', 'size', 'digest')
+    def __init__(self, template, mtime, size, digest):
+        self.template = template
+        self.mtime = mtime
+        self.size = size
+        self.digest = digest
+
+class TemplateLoader(object):
+    ''' returns templates by their file name relative to the directory
+
+    translated templates are kept in LRU cache of maxSize items, cached
+    template is revalidated on every access either by modification time and
+    size of the file ('mtime') or by hash of its content ('hash')
+
+    with cacheDirectory translated programs are also stored on disk,
+    so new processes do not have to parse the templates again
+
+    cacheBackend is shared by [Cache] of all loaded templates
+    '''
+    VALIDATIONS = ('mtime', 'hash')
+
+    def __init__(self, directory, maxSize=100, validation='mtime', encoding='utf-8',
+            templateClass=Template, errorFormatter=None, compiled=False, cacheDirectory=None,
+            cacheBackend=None):
+        if validation not in self.VALIDATIONS:
+            raise ValueError('unknown validation "%s"' % validation)
+        self.directory = os.path.abspath(directory)
+        self.validation = validation
+        self.encoding = encoding
+        self.templateClass = templateClass
+        self.errorFormatter = errorFormatter
+        self.compiled = compiled
+        self.cacheBackend = cacheBackend
+        self.cache = LRUCache(maxSize)
+        self.programCache = ProgramCache(cacheDirectory) if cacheDirectory else None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    def get(self, name):
+        path = self.getPath(name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            raise TemplateNotFound('template "%s" not found' % name)
+        entry = self.cache.get(path)
+        if entry is not None:
+            if self.validation == 'mtime' and (entry.mtime, entry.size) == (stat.st_mtime, stat.st_size):
+                self.count('hits')
+                return entry.template
+            data = self.read(path)
+            if self.validation == 'hash' and entry.digest == self.hash(data):
+                self.count('hits')
+                return entry.template
+            self.count('reloads')
+        else:
+            self.count('misses')
+            data = self.read(path)
+        template = self.createTemplate(data, path)
+        self.cache.set(path, CacheEntry(template, stat.st_mtime, stat.st_size, self.hash(data)))
+        return template
+
+    def getPath(self, name):
+        path = os.path.abspath(os.path.join(self.directory, name))
+        if not path.startswith(self.directory + os.sep):
+            raise TemplateNotFound('template "%s" is outside of %s' % (name, self.directory))
+        return path
+
+    def read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def hash(self, data):
+        return hashlib.sha1(data).digest()
+
+    def createTemplate(self, data, path):
+        source = data.decode(self.encoding)
+        if self.programCache is not None:
+            program = self.programCache.getProgram(source, path)
+            return self.templateClass(program, errorFormatter=self.errorFormatter,
+                compiled=self.compiled, translated=True, cacheBackend=self.cacheBackend)
+        code = Parser(source, path).parse()
+        return self.templateClass(code, errorFormatter=self.errorFormatter, compiled=self.compiled,
+            cacheBackend=self.cacheBackend)
+
+    def count(self, counter):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def getStatistics(self):
+        return {
+            'size': len(self.cache),
+            'maxSize': self.cache.maxSize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'reloads': self.reloads,
+            'evictions': self.cache.evictions,
+        }
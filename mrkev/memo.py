@@ -0,0 +1,143 @@
+'''
+Memoization of blocks declared as pure.
+
+Output of a pure block depends only on its arguments, on $ values of the
+render context it reads and on definitions of blocks found by dynamic
+scoping. Rendered output is stored under the definition and evaluated
+arguments together with $ values and definitions read during its rendering,
+they are compared again before the output is reused. Arguments are evaluated
+once, in scope of definitions the block starts with, and the block is
+rendered from their values. Argument reading a name which the block pushes
+itself (e.g. $Item of List) is evaluated again in place and such output is
+not stored.
+
+Callable values of the render context (loaders) can be memoized for one
+render, loader is then called once per render however many times its value
+is read, see ValueMemo. Loaders called with arguments, which they can read,
+are called every time.
+'''
+
+from types import GeneratorType
+import threading
+
+from mrkev.cache import LRUCache
+
+class BlockMemo(object):
+    ''' memoized block names and caches shared by renders of one template
+
+    every render keeps at most renderSize outputs, sharedSize enables LRU
+    cache shared by all renders of the template
+    '''
+    #outputs kept for the same arguments rendered with different $ values
+    VARIANTS = 4
+
+    def __init__(self, names, renderSize=1000, sharedSize=0):
+        self.names = frozenset(names)
+        self.renderSize = renderSize
+        self.shared = LRUCache(sharedSize) if sharedSize else None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.sharedHits = 0
+        self.misses = 0
+
+    def lookup(self, ip, key, names=frozenset()):
+        ''' returns stored output or None
+
+        names are read by the arguments, see add
+        '''
+        entry = self.find(ip, ip.memoEntries.get(key, ()), names)
+        if entry is not None:
+            self.count('hits')
+        elif self.shared is not None:
+            entry = self.find(ip, self.shared.get(key, ()), names)
+            if entry is not None:
+                self.count('sharedHits')
+                self.addToRender(ip, key, entry)
+        if entry is None:
+            self.count('misses')
+            return None
+        return entry[1]
+
+    def find(self, ip, entries, names):
+        for entry in entries:
+            reads, output, argumentNames = entry
+            if argumentNames is not None and argumentNames != names:
+                continue
+            if all(ip.readValue(name) == value for name, value in reads):
+                return entry
+        return None
+
+    def add(self, ip, key, output, reads, names=None):
+        ''' store output, names read by arguments are compared on lookup unless
+        they are None (arguments were not read in scopes pushed by the block)
+        '''
+        entry = (tuple(reads.items()), output, names)
+        self.addToRender(ip, key, entry)
+        if self.shared is not None:
+            self.shared.set(key, addVariant(self.shared.get(key, ()), entry, self.VARIANTS))
+
+    def addToRender(self, ip, key, entry):
+        if len(ip.memoEntries) < self.renderSize or key in ip.memoEntries:
+            ip.memoEntries[key] = addVariant(ip.memoEntries.get(key, ()), entry, self.VARIANTS)
+
+    def count(self, counter):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def getStatistics(self):
+        lookups = self.hits + self.sharedHits + self.misses
+        return {
+            'hits': self.hits,
+            'sharedHits': self.sharedHits,
+            'misses': self.misses,
+            'hitRate': float(self.hits + self.sharedHits) / lookups if lookups else 0.0,
+        }
+
+def addVariant(entries, entry, limit):
+    #entries are replaced, not modified, they can be read by other threads
+    return (entry,) + tuple(entries[:limit - 1])
+
+class ValueMemo(object):
+    ''' counters of loaders memoized by renders of one template
+
+    values are kept by CustomContext of the render, so they never outlive it
+    '''
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.saved = 0
+
+    def load(self, values, name, loader, ip):
+        ''' value of loader stored in values of the render
+        '''
+        if name in values:
+            self.count('saved')
+            return values[name]
+        value = loader(ip)
+        if isinstance(value, GeneratorType):
+            #value can be read more times
+            value = list(value)
+        values[name] = value
+        self.count('calls')
+        return value
+
+    def loadInCall(self, values, name, loader, ip):
+        ''' value of loader evaluated as block (e.g. [$link href=[a]])
+
+        loader can read arguments of its call, so calls with arguments
+        are not memoized
+        '''
+        if ip.getGetLastCallParameters():
+            self.count('calls')
+            return loader(ip)
+        return self.load(values, name, loader, ip)
+
+    def count(self, counter):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def getStatistics(self):
+        return {
+            'calls': self.calls,
+            'saved': self.saved,
+        }
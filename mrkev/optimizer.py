@@ -0,0 +1,164 @@
+'''
+Folds parts of the program which render always the same output.
+
+Call is constant when it is bound by mrkev.resolver to a definition whose
+content is constant, or to a pure function of the render context (e.g.
+html tags, [Sp]) with constant parameters. Such calls are evaluated once
+and replaced by their output, adjacent strings are then merged (output of
+more fragments is kept apart). Nodes reading parameters, $ values, methods
+or dynamically bound blocks are kept.
+
+Folded calls are no longer counted into recurrence limit of interpreter.
+
+staticNames are $ names whose values are fixed (see Template.specialize),
+they are constant as well, so are the blocks reading only them.
+
+Template functions can push scopes shadowing any block (e.g. import of
+definitions), calls which can be evaluated in arguments of such functions
+are never folded. Functions known not to push such scopes are scopeFreeNames.
+'''
+
+from mrkev.compiler import flatten
+from mrkev.escape import Escaped, Safe
+from mrkev.resolver import GLOBAL, iterNodes
+from mrkev.translator import CallBlock, BlockDefinition, BlockScope
+
+class Optimizer(object):
+    def __init__(self, evaluate, pureNames, staticNames=(), scopeFreeNames=()):
+        ''' evaluate(node) returns list of fragments rendered by node
+            pureNames are names of render context depending only on parameters
+            staticNames are $ names with values fixed for all renders
+            scopeFreeNames are names of render context pushing no block names
+        '''
+        self.evaluate = evaluate
+        self.pureNames = pureNames
+        self.staticNames = staticNames
+        self.scopeFreeNames = scopeFreeNames
+        self.constantDefinitions = {}
+        #ids of calls which can be evaluated in scopes of template functions
+        self.exposed = set()
+        self.folded = 0
+        self.merged = 0
+
+    def optimize(self, program):
+        self.exposed = self.collectExposed(program)
+        return self.optimizeContent(program)
+
+    def collectExposed(self, program):
+        ''' ids of calls in arguments of functions which can push scopes,
+        including calls in definitions they can reach
+        '''
+        definitions = {}
+        for node in iterNodes(program):
+            if isinstance(node, BlockScope):
+                for name, definition in node.params.items():
+                    definitions.setdefault(name, []).append(definition)
+        stack = [value for node in iterNodes(program) if isinstance(node, CallBlock) and self.canPushScope(node)
+            for value in node.params.values()]
+        exposed = set()
+        reached = set()
+        while stack:
+            for node in iterNodes(stack.pop()):
+                if not isinstance(node, CallBlock):
+                    continue
+                exposed.add(id(node))
+                if isinstance(node.binding, BlockDefinition):
+                    targets = [node.binding]
+                else:
+                    targets = definitions.get(node.name, [])
+                for definition in targets:
+                    if id(definition) not in reached:
+                        reached.add(id(definition))
+                        stack.append(definition.content)
+                        stack.extend(definition.params.values())
+        return exposed
+
+    def canPushScope(self, node):
+        if isinstance(node.binding, BlockDefinition) or not node.params:
+            return False
+        head = node.name.split('.')[0]
+        return node.name not in self.scopeFreeNames and head not in self.scopeFreeNames and head not in self.staticNames
+
+    def getStatistics(self):
+        return {
+            'folded': self.folded,
+            'merged': self.merged,
+        }
+
+    def optimizeContent(self, node):
+        items = []
+        for child in flatten(node if isinstance(node, list) else [node]):
+            items.extend(self.optimizeNode(child))
+        items = self.mergeStrings(items)
+        if len(items) == 1 and items[0] and (isinstance(items[0], basestring) or not isinstance(node, list)):
+            return items[0]
+        #empty content has to stay true, parameters tell it apart from missing ones
+        return items or [items]
+
+    def optimizeNode(self, node):
+        if isinstance(node, CallBlock):
+            for name, value in node.params.items():
+                node.params[name] = self.optimizeContent(value)
+            if id(node) not in self.exposed and self.isConstant(node):
+                res = list(self.evaluate(node))
+                if all(isinstance(s, basestring) for s in res):
+                    self.folded += 1
+                    if len(res) > 1:
+                        #fragments are kept apart, e.g. Split output iterated by List
+                        return [res]
+                    return res
+        elif isinstance(node, BlockScope):
+            node.content = self.optimizeContent(node.content)
+            for definition in node.params.values():
+                definition.content = self.optimizeContent(definition.content)
+                for name, value in definition.params.items():
+                    definition.params[name] = self.optimizeContent(value)
+        return [node]
+
+    def mergeStrings(self, items):
+        res = []
+        for item in items:
+            #empty strings are kept, If evaluates them as False
+            if isinstance(item, basestring) and item and res and isinstance(res[-1], basestring) and res[-1]:
+                res[-1] = joinStrings(res[-1], item)
+                self.merged += 1
+            else:
+                res.append(item)
+        return res
+
+    def isConstant(self, node):
+        if isinstance(node, basestring):
+            return True
+        elif isinstance(node, list):
+            return all(self.isConstant(n) for n in node)
+        elif isinstance(node, CallBlock):
+            binding = node.binding
+            if binding is GLOBAL:
+                return self.isPure(node.name) and all(self.isConstant(v) for v in node.params.values())
+            elif isinstance(binding, BlockDefinition):
+                return self.isConstantDefinition(binding)
+            elif binding is None and node.name.startswith('$'):
+                return node.name.split('.')[0] in self.staticNames
+        return False
+
+    def isPure(self, name):
+        return name in self.pureNames or name.split('.')[0] in self.pureNames
+
+    def isConstantDefinition(self, definition):
+        key = id(definition)
+        if key not in self.constantDefinitions:
+            #recursive definitions are not constant
+            self.constantDefinitions[key] = False
+            self.constantDefinitions[key] = self.isConstant(definition.content)
+        return self.constantDefinitions[key]
+
+def joinStrings(first, second):
+    #Safe.__add__ would escape the other string, but text of the program is
+    #markup too, so folded escaped values are joined with it as they are
+    res = u''.join([first, second])
+    if type(first) is Escaped and type(second) is Escaped:
+        #values joined together are still values for m* methods
+        return Escaped(res)
+    if isinstance(first, Safe) or isinstance(second, Safe):
+        return Safe(res)
+    return res
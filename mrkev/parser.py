@@ -1,9 +1,68 @@
-from StringIO import StringIO
+from bisect import bisect_right
+import re
+
+class Origin(object):
+    ''' place of top-level block, spans of the block and its parameters
+    are relative to it
+    '''
+    __slots__ = ('line', 'start')
+
+    def __init__(self, line, start):
+        self.line = line
+        self.start = start
+
+class SourceSpan(object):
+    ''' place of block in source, start and end are offsets of its brackets
+
+    line, start and end are kept relative to origin, spans made by Parser
+    share the origin of their top-level block, so Parser.reparse moves the
+    block by moving its origin; spans without origin are absolute
+    '''
+    __slots__ = ('filename', 'origin', 'lineOffset', 'startOffset', 'endOffset')
+
+    def __init__(self, filename, line, start, end, origin=None):
+        self.filename = filename
+        self.origin = origin or ABSOLUTE
+        self.lineOffset = line
+        self.startOffset = start
+        self.endOffset = end
+
+    @property
+    def line(self):
+        return self.origin.line + self.lineOffset
+
+    @property
+    def start(self):
+        return self.origin.start + self.startOffset
+
+    @property
+    def end(self):
+        return self.origin.start + self.endOffset
+
+    def absolute(self):
+        ''' span of the current place, it does not move with the block
+        '''
+        return SourceSpan(self.filename, self.line, self.start, self.end)
+
+    def __eq__(self, o):
+        return isinstance(o, SourceSpan) and (self.filename, self.line, self.start, self.end) == (o.filename, o.line, o.start, o.end)
+
+    def __ne__(self, o):
+        return not self == o
+
+    def __repr__(self):
+        return '%s:%d' % (self.filename, self.line)
+
+#origin of absolute spans, it is never moved
+ABSOLUTE = Origin(0, 0)
 
 class MarkupBlock(object):
-    def __init__(self, name, params=None):
+    ''' block of parsed markup, span is None for blocks not created by Parser
+    '''
+    def __init__(self, name, params=None, span=None):
         self.name = name
         self.params = params or {}
+        self.span = span
 
     def __eq__(self, o):
         return isinstance(o, MarkupBlock) and self.name == o.name and self.params == o.params
@@ -22,22 +81,31 @@ class MarkupSyntaxError(Exception):
         return '%s\n  File "%s", line %d\n    %s\n    %s' % (self.msg, self.inputFile.name, self.inputFile.lineno + 1, self.inputFile.line, ' '*self.inputFile.pos + '^')
 
 class InputFile:
+    ''' source text with lazily computed line information
+
+    line, lineno and pos describe the character at the offset set by seek,
+    they are computed only when an error has to be reported
+    '''
     def __init__(self, text, name):
-        self.fin = StringIO(text)
+        self.text = text
         self.name = name
         self.pos = 0
         self.line = ''
         self.lineno = 0
 
-    def __iter__(self):
-        for lineno, line in enumerate(self.fin):
-            self.lineno = lineno
-            self.line = line
-            for pos, char in enumerate(line):
-                self.pos = pos
-                yield char
-        while True:
-            yield Parser.EOF
+    def seek(self, offset):
+        if offset >= len(self.text):
+            #errors at the end of file point to the last character
+            offset = max(len(self.text) - 1, 0)
+        lineStart = self.text.rfind('\n', 0, offset) + 1
+        lineEnd = self.text.find('\n', offset)
+        if lineEnd == -1:
+            lineEnd = len(self.text)
+        else:
+            lineEnd += 1
+        self.lineno = self.text.count('\n', 0, lineStart)
+        self.line = self.text[lineStart:lineEnd]
+        self.pos = offset - lineStart
 
 class Parser:
     ''' Grammar:
@@ -54,18 +122,90 @@ class Parser:
 
     EOF = EndOfLineType()
 
+    #scanning jumps over whole runs of characters instead of single ones
+    SPACE_PATTERN = re.compile(r'\s*', re.UNICODE)
+    LINE_END_PATTERN = re.compile(r'\n')
+    UNTIL_PATTERNS = {}
+
     def __init__(self, content, filename='<stdin>'):
-        content = InputFile(content, filename)
-        self.content = content
-        self.inputStream = iter(content)
+        self.content = InputFile(content, filename)
+        self.text = content
+        self.end = len(content)
+        self.position = 0
         self.brackets = 0
-        self.currentChar = self.inputStream.next()
+        #offsets where lines of the parsed region start and line of the first one
+        self.lineStarts = None
+        self.firstLine = 1
+        #origin of the top-level block being parsed
+        self.origin = None
 
     def parse(self):
         self.brackets = 0
+        self.findLines(0, self.end, 1)
         return self.parseContent()
 
+    def findLines(self, start, end, firstLine):
+        self.lineStarts = [start]
+        self.lineStarts.extend(m.end() for m in self.LINE_END_PATTERN.finditer(self.text, start, end))
+        self.firstLine = firstLine
+
+    def getLine(self, offset):
+        return self.firstLine + bisect_right(self.lineStarts, offset) - 1
+
+    def reparse(self, previous, offset, deleted, inserted):
+        ''' parse text which differs from text parsed into previous by an edit
+
+        deleted characters at offset of the previous text were replaced by
+        inserted, only content between the nearest top-level blocks not
+        touched by the edit is parsed again; previous blocks before and after
+        it are reused (origins of the following ones are moved), text is
+        parsed whole when the edit changes them (e.g. unbalanced bracket)
+        '''
+        #last block starting before end of the edit and the first reused one after it
+        j = findBlockAfter(previous, offset + deleted)
+        i = findBlockBefore(previous, j)
+        while i is not None and previous[i].span.end > offset:
+            i = findBlockBefore(previous, i)
+        if i is None:
+            first, regionStart, firstLine = 0, 0, 1
+        else:
+            span = previous[i].span
+            first, regionStart = i + 1, span.end
+            firstLine = span.line + self.text.count('\n', span.start, span.end)
+        shift = len(inserted) - deleted
+        if j is None:
+            last, regionEnd = len(previous), len(self.text)
+        else:
+            last, regionEnd = j, previous[j].span.start + shift
+        #lines are found only in the parsed region
+        self.findLines(regionStart, regionEnd, firstLine)
+        try:
+            self.brackets = 0
+            self.position = regionStart
+            self.end = regionEnd
+            content = self.parseContent()
+        except MarkupSyntaxError:
+            self.position = 0
+            self.end = len(self.text)
+            return self.parse()
+        finally:
+            self.end = len(self.text)
+        following = previous[last:]
+        if following:
+            lineShift = self.getLine(regionEnd) - previous[last].span.line
+            if shift or lineShift:
+                moveOrigins(following, shift, lineShift)
+        return previous[:first] + content + following
+
+    def span(self, start):
+        ''' span from start to current position, relative to the origin
+        '''
+        origin = self.origin
+        return SourceSpan(self.content.name, self.getLine(start) - origin.line,
+            start - origin.start, self.position - origin.start, origin)
+
     def error(self, msg):
+        self.content.seek(self.position)
         raise MarkupSyntaxError(msg, self.content)
 
     def parseContent(self):
@@ -103,6 +243,10 @@ class Parser:
 
 
     def parseBlock(self):
+        #open bracket is already read
+        start = self.position - 1
+        if self.brackets == 0:
+            self.origin = Origin(self.getLine(start), start)
         name = self.parseIdent()
         if not name:
             self.error('no name')
@@ -115,13 +259,14 @@ class Parser:
                 self.next()
                 break
             elif current != '[':
+                paramStart = self.position
                 pname = self.parseParam()
                 current = self.getCurrent()
                 if current == '=':
                     self.next()
                 elif current != self.EOF and pname:
                     #content shortcut
-                    params['#'] = [MarkupBlock(pname)]
+                    params['#'] = [MarkupBlock(pname, span=self.span(paramStart))]
                     continue
 
             if self.getCurrent() == '[':
@@ -132,10 +277,11 @@ class Parser:
                 self.brackets -= 1
             else:
                 #parameter value shortcut
+                useStart = self.position
                 useName = self.parseParam()
                 if not useName:
                     self.error(u'parameter "{0}" has no value'.format(pname))
-                paramValue = [MarkupBlock(useName)]
+                paramValue = [MarkupBlock(useName, span=self.span(useStart))]
 
             if pname == ':' and params:
                 self.error('definition has to precede default parameters')
@@ -144,7 +290,7 @@ class Parser:
                 self.error(u'parameter "{0}" has been already defined'.format(pname))
 
             params[pname] = paramValue
-        return MarkupBlock(name, params)
+        return MarkupBlock(name, params, self.span(start))
 
     def parseIdent(self):
         return self.readUntil('[] \n\r\t')
@@ -157,25 +303,64 @@ class Parser:
             self.error('expects char "%s" found "%s"' % (char, self.getCurrent()))
 
     def getCurrent(self):
-        return self.currentChar
+        if self.position < self.end:
+            return self.text[self.position]
+        return self.EOF
 
     def next(self):
-        if self.currentChar != self.EOF:
-            self.currentChar = self.inputStream.next()
+        if self.position < self.end:
+            self.position += 1
 
-    def read(self, whileCond):
-        read = []
-        while True:
-            current = self.getCurrent()
-            if current != self.EOF and whileCond(current):
-                read.append(current)
-                self.next()
-            else:
-                return ''.join(read)
+    def read(self, pattern):
+        ''' consume the longest prefix matching the compiled pattern
+        '''
+        start = self.position
+        self.position = pattern.match(self.text, start, self.end).end()
+        return self.text[start:self.position]
 
     def readUntil(self, chars):
-        return self.read(lambda c: c not in chars)
+        pattern = self.UNTIL_PATTERNS.get(chars)
+        if pattern is None:
+            pattern = re.compile(u'[^%s]*' % re.escape(chars), re.UNICODE)
+            self.UNTIL_PATTERNS[chars] = pattern
+        return self.read(pattern)
 
     def readSpace(self):
-        return self.read(lambda c: c.isspace())
+        return self.read(self.SPACE_PATTERN)
 
+def findBlockAfter(blocks, offset):
+    ''' index of the first block starting at offset or after it, None if there is none
+
+    blocks are searched by bisection, strings between them are skipped
+    '''
+    lo, hi = 0, len(blocks)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        i = mid
+        while i < hi and not isinstance(blocks[i], MarkupBlock):
+            i += 1
+        if i == hi:
+            hi = mid
+        elif blocks[i].span.start < offset:
+            lo = i + 1
+        else:
+            hi = mid
+    while lo < len(blocks) and not isinstance(blocks[lo], MarkupBlock):
+        lo += 1
+    return lo if lo < len(blocks) else None
+
+def findBlockBefore(blocks, index):
+    ''' index of the last block before index (None means end), None if there is none
+    '''
+    i = (len(blocks) if index is None else index) - 1
+    while i >= 0 and not isinstance(blocks[i], MarkupBlock):
+        i -= 1
+    return i if i >= 0 else None
+
+def moveOrigins(blocks, shift, lineShift):
+    ''' move top-level blocks, spans of their parameters move with them
+    '''
+    for block in blocks:
+        if isinstance(block, MarkupBlock) and block.span is not None:
+            block.span.origin.start += shift
+            block.span.origin.line += lineShift
@@ -0,0 +1,99 @@
+'''
+Time spent by rendering in blocks of template.
+
+RenderProfile is attached to one interpreter, it replaces evalCallBlock of
+the interpreter instance by a measuring one, so renders without profile run
+the same code as before. Every call of a block is measured under its name,
+calls of template functions, m* methods and html.* tags included (they are
+called as blocks too, e.g. [List ...] is measured as List).
+
+inclusive time of a block contains blocks called from it (time of recursive
+calls is counted once), exclusive time does not, output bytes are counted
+in utf-8 and contain output of called blocks.
+
+Exclusive time is also recorded for every stack of calls, writeCollapsed
+exports it in collapsed stack format read by flamegraph tools (e.g.
+flamegraph.pl), frames are block names with file:line of the call.
+'''
+
+import timeit
+
+class RenderProfile(object):
+    def __init__(self, clock=timeit.default_timer):
+        self.clock = clock
+        #name -> [calls, inclusive, exclusive, bytes]
+        self.blocks = {}
+        #time spent in called blocks for every block being evaluated
+        self.childTimes = []
+        self.active = {}
+        #frames of blocks being evaluated and exclusive time by stack
+        self.frames = []
+        self.stacks = {}
+
+    def attach(self, ip):
+        ''' measure block calls of the interpreter
+        '''
+        evalCallBlock = ip.evalCallBlock
+        def profiledCallBlock(block):
+            name = block.name
+            self.active[name] = self.active.get(name, 0) + 1
+            self.frames.append(formatFrame(block))
+            self.childTimes.append(0.0)
+            start = self.clock()
+            res = None
+            try:
+                res = evalCallBlock(block)
+            finally:
+                self.add(name, self.clock() - start, res)
+            return res
+        ip.evalCallBlock = profiledCallBlock
+        ip.profile = self
+
+    def add(self, name, elapsed, output):
+        childTime = self.childTimes.pop()
+        if self.childTimes:
+            self.childTimes[-1] += elapsed
+        self.active[name] -= 1
+        stats = self.blocks.get(name)
+        if stats is None:
+            stats = self.blocks[name] = [0, 0.0, 0.0, 0]
+        stats[0] += 1
+        if not self.active[name]:
+            stats[1] += elapsed
+        stats[2] += elapsed - childTime
+        stack = ';'.join(self.frames)
+        self.stacks[stack] = self.stacks.get(stack, 0.0) + elapsed - childTime
+        self.frames.pop()
+        if output:
+            stats[3] += sum(len(unicode(s).encode('utf-8')) for s in output)
+
+    def getStatistics(self):
+        return dict((name, {
+            'calls': calls,
+            'inclusive': inclusive,
+            'exclusive': exclusive,
+            'bytes': size,
+        }) for name, (calls, inclusive, exclusive, size) in self.blocks.items())
+
+    def format(self, limit=20):
+        ''' table of blocks with the greatest exclusive time
+        '''
+        rows = sorted(self.blocks.items(), key=lambda item: item[1][2], reverse=True)[:limit]
+        lines = ['%-24s %8s %12s %12s %10s' % ('block', 'calls', 'incl. ms', 'excl. ms', 'bytes')]
+        for name, (calls, inclusive, exclusive, size) in rows:
+            lines.append('%-24s %8d %12.3f %12.3f %10d' % (name, calls, inclusive * 1e3, exclusive * 1e3, size))
+        return '\n'.join(lines)
+
+    def writeCollapsed(self, fileobj):
+        ''' write lines "frame;frame;... microseconds" of exclusive time
+        '''
+        for stack, seconds in sorted(self.stacks.items()):
+            fileobj.write('%s %d\n' % (stack, round(seconds * 1e6)))
+
+def formatFrame(block):
+    span = block.span
+    #semicolons separate frames
+    name = block.name.replace(';', ':')
+    if span is None:
+        return name
+    return '%s (%s:%d)' % (name, span.filename.replace(';', ':'), span.line)
@@ -0,0 +1,109 @@
+'''
+Binds names of the translated program where it can be decided statically.
+
+Blocks are looked up dynamically, definition visible in the calling scope
+may come from any scope pushed later. The call is bound to a definition only
+if no other scope of the program defines the same name. Names not defined
+in the program at all come from the render context. While a template
+function pushes its own scope (e.g. import of definitions), it can shadow
+any name, so all scopes are searched for bound calls too. Names starting
+with $ are always looked up, template functions (e.g. List) push their own
+$ names.
+
+Every definition gets index of a frame holding its active calls, so
+parameters find the nearest call without walking all call scopes.
+
+Names which can come from the render context get compiled accessors,
+see mrkev.accessor.
+'''
+
+from mrkev.accessor import getAccessor
+from mrkev.translator import CallBlock, CallParameter, BlockDefinition, BlockScope
+
+class GlobalBinding(object):
+    def __repr__(self):
+        return 'GLOBAL'
+
+    def __reduce__(self):
+        #pickled programs keep the same marker
+        return 'GLOBAL'
+
+#binding of blocks found in the render context
+GLOBAL = GlobalBinding()
+
+class Resolver(object):
+    def __init__(self):
+        self.definers = {}
+        self.lexicalScopes = []
+        self.slots = 0
+        self.resolved = 0
+
+    def resolve(self, program):
+        ''' bind calls and parameters of program, returns count of bound calls
+        '''
+        self.collectDefinitions(program)
+        self.resolveNode(program)
+        return self.resolved
+
+    def collectDefinitions(self, node):
+        for child in iterNodes(node):
+            if isinstance(child, BlockScope):
+                for name in child.params:
+                    self.definers.setdefault(name, []).append(child)
+            elif isinstance(child, BlockDefinition):
+                self.slots += 1
+                child.slot = self.slots
+
+    def resolveNode(self, node):
+        if isinstance(node, list):
+            for n in node:
+                self.resolveNode(n)
+        elif isinstance(node, CallBlock):
+            node.binding = self.getBinding(node.name)
+            if node.binding is not None:
+                self.resolved += 1
+            if not isinstance(node.binding, BlockDefinition):
+                #names of the render context get their accessors in advance
+                getAccessor(node.name)
+            for value in node.params.values():
+                self.resolveNode(value)
+        elif isinstance(node, CallParameter):
+            if node.lexicalScope is not None:
+                node.slot = node.lexicalScope.slot
+        elif isinstance(node, BlockScope):
+            self.lexicalScopes.append(node)
+            self.resolveNode(node.content)
+            for definition in node.params.values():
+                self.resolveNode(definition.content)
+                for value in definition.params.values():
+                    self.resolveNode(value)
+            self.lexicalScopes.pop()
+
+    def getBinding(self, name):
+        if name.startswith('$'):
+            return None
+        definers = self.definers.get(name)
+        if not definers:
+            return GLOBAL
+        if len(definers) == 1 and any(s is definers[0] for s in self.lexicalScopes):
+            return definers[0].params[name]
+        return None
+
+def iterNodes(node):
+    ''' all nodes of the program in depth first order
+    '''
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(reversed(node))
+            continue
+        yield node
+        if isinstance(node, CallBlock):
+            stack.extend(node.params.values())
+        elif isinstance(node, BlockScope):
+            stack.append(node.content)
+            stack.extend(node.params.values())
+        elif isinstance(node, BlockDefinition):
+            stack.append(node.content)
+            stack.extend(node.params.values())
@@ -0,0 +1,104 @@
+'''
+Converts translated program to compact binary form and back.
+
+Nodes are encoded as tuples starting with node type, strings and lists are
+kept as they are and the whole structure is stored by marshal. Parameters
+refer to their lexical scope by index of the definition. Source spans of
+calls and parameters are kept as (filename, line, start, end) or None.
+'''
+
+import marshal
+
+from mrkev.parser import SourceSpan
+from mrkev.translator import CallBlock, CallParameter, BlockDefinition, BlockScope
+
+FORMAT_VERSION = 2
+
+CALL_BLOCK, CALL_PARAMETER, BLOCK_DEFINITION, BLOCK_SCOPE = range(4)
+
+class SerializationError(Exception):
+    pass
+
+def dumpProgram(program):
+    return marshal.dumps((FORMAT_VERSION, Encoder().encode(program)))
+
+def loadProgram(data):
+    try:
+        version, encoded = marshal.loads(data)
+    except (EOFError, ValueError, TypeError) as e:
+        raise SerializationError('invalid data: %s' % e)
+    if version != FORMAT_VERSION:
+        raise SerializationError('unsupported format version %r' % (version,))
+    try:
+        return Decoder().decode(encoded)
+    except (IndexError, KeyError, TypeError, ValueError) as e:
+        raise SerializationError('invalid program: %s' % e)
+
+class Encoder(object):
+    def __init__(self):
+        self.definitions = {}
+
+    def encode(self, node):
+        if isinstance(node, basestring):
+            return node
+        elif isinstance(node, list):
+            return [self.encode(n) for n in node]
+        elif isinstance(node, CallBlock):
+            return (CALL_BLOCK, node.name, self.encodeParams(node.params), encodeSpan(node.span))
+        elif isinstance(node, CallParameter):
+            scope = self.definitions[id(node.lexicalScope)] if node.lexicalScope is not None else -1
+            return (CALL_PARAMETER, node.name, scope, node.inDefaultParameter, encodeSpan(node.span))
+        elif isinstance(node, BlockDefinition):
+            index = len(self.definitions)
+            self.definitions[id(node)] = index
+            return (BLOCK_DEFINITION, index, node.name, self.encode(node.content), self.encodeParams(node.params))
+        elif isinstance(node, BlockScope):
+            return (BLOCK_SCOPE, self.encode(node.content), self.encodeParams(node.params))
+        else:
+            raise SerializationError('cannot serialize %r' % (node,))
+
+    def encodeParams(self, params):
+        return [(name, self.encode(value)) for name, value in params.items()]
+
+class Decoder(object):
+    def __init__(self):
+        self.definitions = {}
+
+    def decode(self, node):
+        if isinstance(node, basestring):
+            return node
+        elif isinstance(node, list):
+            return [self.decode(n) for n in node]
+        nodeType = node[0]
+        if nodeType == CALL_BLOCK:
+            res = CallBlock(node[1], decodeSpan(node[3]))
+            self.decodeParams(res, node[2])
+        elif nodeType == CALL_PARAMETER:
+            scope = self.definitions[node[2]] if node[2] != -1 else None
+            res = CallParameter(node[1], lexicalScope=scope, inDefaultParameter=node[3], span=decodeSpan(node[4]))
+        elif nodeType == BLOCK_DEFINITION:
+            res = BlockDefinition(node[2])
+            self.definitions[node[1]] = res
+            res.content = self.decode(node[3])
+            self.decodeParams(res, node[4])
+        elif nodeType == BLOCK_SCOPE:
+            res = BlockScope()
+            res.content = self.decode(node[1])
+            self.decodeParams(res, node[2])
+        else:
+            raise ValueError('unknown node type %r' % (nodeType,))
+        return res
+
+    def decodeParams(self, node, params):
+        for name, value in params:
+            node.addParam(name, self.decode(value))
+
+def encodeSpan(span):
+    if span is None:
+        return None
+    return (span.filename, span.line, span.start, span.end)
+
+def decodeSpan(encoded):
+    if encoded is None:
+        return None
+    return SourceSpan(*encoded)
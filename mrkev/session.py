@@ -0,0 +1,93 @@
+'''
+Repeated rendering of one template with changing values.
+
+Output of the template is split into top-level fragments, nodes of the
+template content (texts and calls of blocks, definitions are not fragments).
+RenderSession remembers output of every fragment with $ values and dotted
+paths (e.g. $user.name) it read, next render reuses the output when all of
+the values stay the same and renders only fragments with changed inputs.
+
+As with MEMOIZED_BLOCKS, output of fragments has to depend only on $ values,
+m* methods called by them have to be pure. Values are compared by ==, so
+values changed in place (e.g. list appended to) have to be passed as new
+objects. diff returns only fragments whose output changed, e.g. to push
+updates of a page already shown.
+'''
+
+from mrkev.translator import BlockScope
+
+class RenderSession(object):
+    def __init__(self, template):
+        self.template = template
+        self.scope, self.nodes = splitFragments(template.program)
+        #(reads, output) of every fragment from the last render
+        self.fragments = None
+        self.rendered = 0
+        self.reused = 0
+
+    def render(self, **kwargs):
+        ''' whole output of template rendered with kwargs
+        '''
+        self.update(kwargs)
+        return u''.join(output for reads, output in self.fragments)
+
+    def diff(self, **kwargs):
+        ''' list of (index, output) of fragments changed since the last render,
+        first render returns all fragments
+        '''
+        previous = self.fragments
+        self.update(kwargs)
+        if previous is None:
+            return [(i, output) for i, (reads, output) in enumerate(self.fragments)]
+        return [(i, output) for i, (reads, output) in enumerate(self.fragments) if output != previous[i][1]]
+
+    def reset(self):
+        ''' forget outputs, next render evaluates all fragments
+        '''
+        self.fragments = None
+
+    def update(self, kwargs):
+        ip = self.template.createInterpreter(kwargs)
+        if self.scope is not None:
+            ip.addBlockScope(self.scope)
+        depth = len(ip.blockScopes)
+        fragments = []
+        for i, node in enumerate(self.nodes):
+            if self.fragments is not None:
+                reads, output = self.fragments[i]
+                if all(ip.readValue(name) == value for name, value in reads):
+                    fragments.append(self.fragments[i])
+                    self.reused += 1
+                    continue
+            ip.readRecorders.append((depth, {}))
+            try:
+                output = ip.evalText(node)
+            finally:
+                reads = ip.readRecorders.pop()[1]
+            fragments.append((tuple(reads.items()), output))
+            self.rendered += 1
+        self.fragments = fragments
+
+    def getStatistics(self):
+        return {
+            'fragments': len(self.nodes),
+            'rendered': self.rendered,
+            'reused': self.reused,
+        }
+
+def splitFragments(program):
+    ''' top-level block scope (or None) and nodes of its content
+    '''
+    scope = None
+    if isinstance(program, BlockScope):
+        scope = program
+        program = program.content
+    nodes = []
+    stack = [program]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(reversed(node))
+        else:
+            nodes.append(node)
+    return scope, nodes
@@ -0,0 +1,69 @@
+#encoding: utf-8
+'''
+Fixtures shared by tests of more modules.
+'''
+
+from mrkev.interpreter import Template
+
+#options of Template rendering the same output in different ways
+RENDER_OPTIONS = [{}, dict(compiled=True), dict(iterative=True), dict(optimized=True), dict(autoescape=True)]
+
+class CountingTemplate(Template):
+    ''' counts calls of its m* methods and builds of their wrappers
+    '''
+    def __init__(self, *args, **kwargs):
+        self.calls = 0
+        self.builds = 0
+        super(CountingTemplate, self).__init__(*args, **kwargs)
+
+    def _getStringBasedMethods(self):
+        self.builds += 1
+        return super(CountingTemplate, self)._getStringBasedMethods()
+
+    def mTick(self):
+        self.calls += 1
+        return ''
+
+    def mUpper(self, content):
+        self.calls += 1
+        return content.upper()
+
+    def mMenu(self):
+        self.calls += 1
+        return '<ul>%d</ul>' % self.calls
+
+#templates with parameters rendering the same output by all backends
+SAMPLES = [
+    ('Hello [$name]!', {'name': 'world'}),
+    ('[a] [b c=[d]]', {}),
+    ('[c :=c][c]', {}),
+    ('[c :=# #][c]', {}),
+    ('[Greeting :=[Hello [name]!]][Greeting name=[[name]]]', {}),
+    ('[print :=[[#var]] var=[xxx]][print] [print var=[bbb]]', {}),
+    ('[A :=#a a=#b][A a=[xxx]] [A b=[yyy]]', {}),
+    ('[A :=#][B :=[[A [[A #Name]]]]][B Name=[a]]', {}),
+    ('[Bird :=[[#A] and [#B]] A=[has feathers] B=[flies]][Penguin :=[[Bird B=@]] B=[swims]][Penguin]', {}),
+    ('[If [[Missing]] Then=[true] Else=[false]] [If [x] Then=[true] Else=[false]]', {}),
+    ('[(]1[)][Sp]aaa[*comment*]bbb', {}),
+    ('''
+    [Link :=[<a href="[#Target]">[#]</a>]]
+    [List Seq=[[$links]] Sep=[,] [
+        [Link Target=[[$Item.url]] [[$Order]. [$Item.title][If [[$Last]] Then=[!]]]]
+    ]]
+    ''', {'links': [{'url': 'http://a.com', 'title': 'A'}, {'url': 'http://b.com', 'title': u'Č'}]}),
+    ('[List Seq=[[Split [a$b$c] Sep=[$]]] Sep=[_] [[$Item]]] [List Seq=[[$x]] IfEmpty=[none] [x]]', {'x': []}),
+    ('''
+    [ul :=[
+        [Item :=[[html.li #]]]
+        [html.ul #]
+    ]]
+    [Link :=[[html.a href=@ #]] href=#Target]
+    [ul [
+        [.] dolor sit amen
+        [.] [>~/contacts [contacts]]
+    ]]
+    [html.a:b:c]
+    ''', {}),
+    ('[A :=[[#x]-[#y]] x=[dx] y=[[#x]]][A] [A x=[1]] [A y=[2]] [A x=[[#Missing]]]', {}),
+    ('[A :=[[B :=[<[#]>]][B [[#]]]]][A [[A [x]]]]', {}),
+]
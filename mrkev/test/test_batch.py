@@ -0,0 +1,96 @@
+import cPickle
+import os
+import unittest
+from mrkev.interpreter import Template
+from mrkev.test.helpers import RENDER_OPTIONS, SAMPLES
+
+class WorkerTemplate(Template):
+    def mWorker(self):
+        return u'%d-%d' % (os.getpid(), id(self))
+
+    def mUpper(self, content):
+        return content.upper()
+
+class Site(object):
+    def __init__(self, name):
+        self.name = name
+
+class Page(Template):
+    ''' template with its own constructor
+    '''
+    def __init__(self, code, site):
+        super(Page, self).__init__(code, memoizeValues=True)
+        self.site = site
+
+    def mSite(self):
+        return self.site.name
+
+def failToLoad():
+    raise ValueError('not loadable')
+
+class Unloadable(object):
+    def __reduce__(self):
+        return failToLoad, ()
+
+CODE = u'[Row :=[<li>[Upper #]</li>]]<ul>[List Seq=[[$items]] [[Row [[$Item]]]]]</ul>'
+
+def createParams(count):
+    return [{'items': [u'a%d' % i, u'<b>']} for i in range(count)]
+
+class TestRenderMany(unittest.TestCase):
+    def testSameOutputAsRender(self):
+        params = createParams(40)
+        for options in RENDER_OPTIONS:
+            template = WorkerTemplate(CODE, **options)
+            expected = [template.render(**kwargs) for kwargs in params]
+            self.assertEqual(list(template.render_many(params, workers=2, chunksize=3)), expected)
+
+    def testSubclassWithOwnConstructor(self):
+        template = Page(u'[Site]: [$n]', Site(u'example.com'))
+        params = [{'n': i} for i in range(10)]
+        expected = [template.render(**kwargs) for kwargs in params]
+        self.assertEqual(list(template.render_many(params, workers=2, chunksize=2)), expected)
+
+    def testTemplateNotLoadedByWorker(self):
+        template = WorkerTemplate(CODE)
+        template.attribute = Unloadable()
+        self.assertRaises(ValueError, lambda: list(template.render_many(createParams(10), workers=2)))
+
+    def testTemplateNotPickled(self):
+        template = WorkerTemplate(CODE)
+        template.attribute = lambda: None
+        #raised by the call, before the outputs are read
+        self.assertRaises(cPickle.PicklingError, lambda: template.render_many(createParams(10), workers=2))
+
+    def testSamples(self):
+        for code, p in SAMPLES:
+            template = Template(code)
+            self.assertEqual(list(template.render_many([p, p], workers=2)), [template.render(**p)] * 2)
+
+    def testUnordered(self):
+        params = createParams(30)
+        template = WorkerTemplate(CODE)
+        res = list(template.render_many(params, workers=2, chunksize=4, ordered=False))
+        self.assertEqual(sorted(i for i, output in res), range(30))
+        for i, output in res:
+            self.assertEqual(output, template.render(**params[i]))
+
+    def testTemplateIsSentOnce(self):
+        res = list(WorkerTemplate(u'[Worker]').render_many([{}] * 50, workers=2, chunksize=1))
+        #every worker renders with the template it built when it started
+        pids = dict(tuple(s.split('-')) for s in res)
+        self.assertTrue(len(set(res)) <= 2)
+        self.assertEqual(len(pids), len(set(res)))
+        self.assertFalse(str(os.getpid()) in pids)
+
+    def testSingleWorkerRendersInProcess(self):
+        template = WorkerTemplate(u'[Worker]')
+        self.assertEqual(list(template.render_many([{}, {}], workers=1)), [template.render()] * 2)
+        self.assertEqual(list(template.render_many([{}], workers=1, ordered=False)), [(0, template.render())])
+
+    def testGenerator(self):
+        params = ({'items': [i]} for i in range(10))
+        self.assertEqual(len(list(WorkerTemplate(CODE).render_many(params, workers=2))), 10)
+
+if __name__ == '__main__':
+    unittest.main()
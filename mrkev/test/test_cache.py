@@ -0,0 +1,152 @@
+#encoding: utf-8
+
+import os
+import shutil
+import tempfile
+import unittest
+from mrkev.cache import CacheBackend, MemoryCache, ProgramCache
+from mrkev.interpreter import Template
+from mrkev.serializer import SerializationError, dumpProgram, loadProgram
+from mrkev.translator import Translator
+from mrkev.parser import Parser
+from mrkev.test.helpers import SAMPLES, CountingTemplate
+
+def translate(code):
+    return Translator().translate(Parser(code).parse())
+
+class TestSerializer(unittest.TestCase):
+    def testRoundTrip(self):
+        for code, params in SAMPLES:
+            program = loadProgram(dumpProgram(translate(code)))
+            self.assertEqual(Template(program, translated=True).render(**params), Template(code).render(**params))
+
+    def testLexicalScopeIsShared(self):
+        program = loadProgram(dumpProgram(translate('[a :=#x x=[y]]')))
+        definition = program.params['a']
+        self.assertTrue(definition.content.lexicalScope is definition)
+
+    def testSourceSpansAreKept(self):
+        program = loadProgram(dumpProgram(Translator().translate(Parser('[a [b]][a :=[\n[#]]]', 'page.mrkev').parse())))
+        self.assertEqual(repr(program.content.span), 'page.mrkev:1')
+        self.assertEqual(repr(program.params['a'].content.span), 'page.mrkev:2')
+
+    def testCorruptedData(self):
+        data = dumpProgram(translate('[a :=[[#]]][a [b]]'))
+        self.assertRaises(SerializationError, lambda: loadProgram(data[:len(data) // 2]))
+        self.assertRaises(SerializationError, lambda: loadProgram('garbage'))
+
+class TestProgramCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testProgramIsStored(self):
+        code = u'[a :=[Hello [#]]][a [světe]]'
+        ProgramCache(self.directory).getProgram(code)
+        cache = ProgramCache(self.directory)
+        program = cache.getProgram(code)
+        self.assertEqual(cache.getStatistics(), {'hits': 1, 'misses': 0, 'invalid': 0})
+        self.assertEqual(Template(program, translated=True).render(), u'Hello světe')
+
+    def testCorruptedFileIsReplaced(self):
+        cache = ProgramCache(self.directory)
+        cache.getProgram('[x]')
+        path = cache.getPath(cache.getKey('[x]'))
+        with open(path, 'wb') as f:
+            f.write('\x00broken')
+        self.assertEqual(Template(cache.getProgram('[x]'), translated=True).render(), '[x not found]')
+        self.assertEqual(cache.invalid, 1)
+        cache.getProgram('[x]')
+        self.assertEqual(cache.hits, 1)
+
+    def testOtherVersionIsIgnored(self):
+        cache = ProgramCache(self.directory)
+        cache.getProgram('[x]')
+        cache.getHeader = lambda key: ('mrkev-program', '0.0', (2, 7), key)
+        cache.getProgram('[x]')
+        self.assertEqual((cache.hits, cache.invalid), (0, 1))
+
+    def testUnwritableDirectory(self):
+        path = os.path.join(self.directory, 'file')
+        open(path, 'w').close()
+        cache = ProgramCache(os.path.join(path, 'cache'))
+        self.assertEqual(Template(cache.getProgram('x'), translated=True).render(), 'x')
+
+class DictBackend(CacheBackend):
+    ''' backend for tests, keeps values with their ttl forever
+    '''
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        item = self.values.get(key)
+        return item[0] if item else None
+
+    def set(self, key, value, ttl=0):
+        self.values[key] = (value, ttl)
+
+class Clock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class TestMemoryCache(unittest.TestCase):
+    def testExpiration(self):
+        clock = Clock()
+        cache = MemoryCache(clock=clock)
+        cache.set('a', u'x', ttl=10)
+        cache.set('b', u'y')
+        clock.now += 10
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(cache.get('b'), u'y')
+        self.assertEqual(cache.getStatistics()['expirations'], 1)
+
+    def testEviction(self):
+        cache = MemoryCache(maxSize=2)
+        for key in 'abc':
+            cache.set(key, key)
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(cache.getStatistics(), {'size': 2, 'evictions': 1, 'expirations': 0})
+
+class TestCacheFunction(unittest.TestCase):
+    def testContentIsRenderedOnce(self):
+        template = CountingTemplate('[Cache Key=[menu] [[Menu]]] [$page]')
+        self.assertEqual(template.render(page='a'), '<ul>1</ul> a')
+        self.assertEqual(template.render(page='b'), '<ul>1</ul> b')
+        self.assertEqual(template.fragmentCache.getStatistics(),
+            {'hits': 1, 'misses': 1, 'evictions': 0, 'expirations': 0, 'size': 1})
+
+    def testTtl(self):
+        clock = Clock()
+        template = CountingTemplate('[Cache Key=[menu] Ttl=[60] [[Menu]]]', cacheBackend=MemoryCache(clock=clock))
+        template.render()
+        clock.now += 59
+        self.assertEqual(template.render(), '<ul>1</ul>')
+        clock.now += 1
+        self.assertEqual(template.render(), '<ul>2</ul>')
+
+    def testKeys(self):
+        template = CountingTemplate('[Cache Key=[menu-[$lang]] [[Menu]]]')
+        self.assertEqual(template.render(lang='cs'), '<ul>1</ul>')
+        self.assertEqual(template.render(lang='en'), '<ul>2</ul>')
+        self.assertEqual(template.render(lang='cs'), '<ul>1</ul>')
+
+    def testWithoutKey(self):
+        template = CountingTemplate('[Cache [[Menu]]][Cache [[Menu]]]')
+        self.assertEqual(template.render(), '<ul>1</ul><ul>2</ul>')
+
+    def testInvalidTtl(self):
+        self.assertEqual(Template('[Cache Key=[a] Ttl=[soon] [x]]').render(), '[Ttl "soon" invalid]')
+
+    def testCustomBackend(self):
+        backend = DictBackend()
+        template = CountingTemplate('[Cache Key=[menu] Ttl=[30] [[Menu]]]', cacheBackend=backend)
+        template.render()
+        self.assertEqual(backend.values, {'menu': (u'<ul>1</ul>', 30)})
+        other = CountingTemplate('[Cache Key=[menu] [[Menu]]]', cacheBackend=backend, compiled=True)
+        self.assertEqual(other.render(), '<ul>1</ul>')
+        self.assertEqual(other.fragmentCache.getStatistics(), {'hits': 1, 'misses': 0, 'evictions': 0})
@@ -0,0 +1,42 @@
+#encoding: utf-8
+
+import unittest
+from mrkev.interpreter import Template
+from mrkev.test.helpers import SAMPLES
+
+class TestCompiledTemplate(unittest.TestCase):
+    def testSameOutput(self):
+        for code, params in SAMPLES:
+            expected = Template(code).render(**params)
+            self.assertEqual(Template(code, compiled=True).render(**params), expected)
+
+    def testMethods(self):
+        class TestingTemplate(Template):
+            def mGreeting(self, name):
+                return u'Hello %s!' % name
+        code = '[Greeting name=[Ms. [$name]]]'
+        self.assertEqual(TestingTemplate(code, compiled=True).render(name='Black'), 'Hello Ms. Black!')
+
+    def testCodeIsCached(self):
+        template = Template('[a :=[x [#]]][a [y]]', compiled=True)
+        self.assertTrue(template.code)
+        self.assertEqual(template.render(), 'x y')
+
+    def testRecurrenceLimit(self):
+        code = '[R :=[r[R]]][R]'
+        self.assertEqual(Template(code, compiled=True).render(), Template(code).render())
+
+    def testBoundCallsAreNotDelegated(self):
+        template = Template('[a :=[x [#]]][b :=[[a [[#]]]]][b [y]] [List Seq=[[$s]] [[a [[$Item]]]]]', compiled=True)
+        ip = template.createInterpreter({'s': ['1']})
+        calls = []
+        evalCallBlock = ip.evalCallBlock
+        def countingCallBlock(block):
+            calls.append(block.name)
+            return evalCallBlock(block)
+        ip.evalCallBlock = countingCallBlock
+        self.assertEqual(ip.evalToString(), 'x y x 1')
+        self.assertEqual(calls, ['List', '$Item'])
+
+    def testInterpretedTemplateHasNoCode(self):
+        self.assertEqual(Template('x').code, None)
@@ -0,0 +1,118 @@
+import time
+import unittest
+from mrkev.deferred import Deferred, registerDeferredType
+from mrkev.interpreter import Template
+
+LATENCY = 0.2
+
+class FakeService(object):
+    ''' data source answering after LATENCY seconds
+    '''
+    def __init__(self):
+        self.calls = 0
+
+    def fetch(self, value):
+        self.calls += 1
+        return Deferred(self.answer, value)
+
+    def answer(self, value):
+        time.sleep(LATENCY)
+        return value
+
+class ServiceTemplate(Template):
+    def __init__(self, code, service, **kwargs):
+        super(ServiceTemplate, self).__init__(code, **kwargs)
+        self.service = service
+
+    def mFetch(self, content):
+        return self.service.fetch(u'<%s>' % content)
+
+    def mUpper(self, content):
+        return content.upper()
+
+class Task(object):
+    ''' value with result and done attributes which is not deferred
+    '''
+    def __init__(self, number):
+        self.result = number
+        self.done = True
+
+    def __unicode__(self):
+        return u'Task<%d>' % self.result
+
+class Promise(object):
+    ''' deferred type registered by registerDeferredType
+    '''
+    def __init__(self, value):
+        self.value = value
+
+    def done(self):
+        return True
+
+    def result(self, timeout=None):
+        return self.value
+
+registerDeferredType(Promise)
+
+def measure(f):
+    start = time.time()
+    res = f()
+    return res, time.time() - start
+
+class TestRenderAsync(unittest.TestCase):
+    def setUp(self):
+        self.service = FakeService()
+
+    def testValuesAreFetchedConcurrently(self):
+        params = dict(('v%d' % i, self.service.fetch(u'%d' % i)) for i in range(5))
+        template = Template(u'[$v0] [$v1] [$v2] [$v3] [$v4]')
+        res, elapsed = measure(lambda: template.render_async(**params))
+        self.assertEqual(res, u'0 1 2 3 4')
+        #close to the slowest fetch, far from the sum of all of them
+        self.assertTrue(elapsed < 2 * LATENCY, elapsed)
+
+    def testMethodsAreFetchedConcurrently(self):
+        template = ServiceTemplate(u'[Fetch [a]][Fetch [b]][List Seq=[[$items]] [[Fetch [[$Item]]]]]', self.service)
+        res, elapsed = measure(lambda: template.render_async(items=['c', 'd', 'e']))
+        self.assertEqual(res, u'<a><b><c><d><e>')
+        self.assertEqual(self.service.calls, 5)
+        self.assertTrue(elapsed < 2 * LATENCY, elapsed)
+
+    def testFunctionValues(self):
+        res = Template(u'[$f], [$f]').render_async(f=lambda ip: self.service.fetch(u'x'))
+        self.assertEqual(res, u'x, x')
+
+    def testValuesReadByBlocks(self):
+        template = ServiceTemplate(u'[If [$flag] Then=[[Upper [[$user.name]]]]] [List Seq=[[$rows]] Sep=[,] [[$Item]]]', self.service)
+        res = template.render_async(flag=self.service.fetch(True),
+            user=self.service.fetch({'name': u'joe'}), rows=self.service.fetch([1, 2]))
+        self.assertEqual(res, u'JOE 1,2')
+
+    def testAutoescape(self):
+        template = ServiceTemplate(u'[$v] [Fetch [x]]', self.service, autoescape=True)
+        self.assertEqual(template.render_async(v=self.service.fetch(u'a&b')), u'a&amp;b &lt;x&gt;')
+
+    def testCompiledAndIterative(self):
+        params = {'v': self.service.fetch(u'v'), 'items': self.service.fetch([u'a', u'b'])}
+        code = u'[$v][List Seq=[[$items]] [[Fetch [[$Item]]]]]'
+        for options in [dict(compiled=True), dict(iterative=True)]:
+            self.assertEqual(ServiceTemplate(code, self.service, **options).render_async(**params), u'v<a><b>')
+
+    def testOtherValuesAreNotDeferred(self):
+        for options in [{}, dict(autoescape=True)]:
+            template = Template(u'[$t]', **options)
+            expected = u'Task&lt;1&gt;' if options else u'Task<1>'
+            self.assertEqual(template.render(t=Task(1)), expected)
+            self.assertEqual(template.render_async(t=Task(1)), expected)
+
+    def testRegisteredType(self):
+        template = Template(u'[$p] [$q.name]', autoescape=True)
+        self.assertEqual(template.render_async(p=Promise(u'<a>'), q=Promise({'name': u'<joe>'})), u'&lt;a&gt; &lt;joe&gt;')
+
+    def testErrorIsRaised(self):
+        def fail():
+            raise ValueError('service unavailable')
+        self.assertRaises(ValueError, lambda: Template(u'[$v]').render_async(v=Deferred(fail)))
+
+if __name__ == '__main__':
+    unittest.main()
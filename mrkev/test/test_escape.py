@@ -0,0 +1,123 @@
+#encoding: utf-8
+
+import unittest
+from mrkev.escape import Escaped, Safe, escape, joinArgument
+from mrkev.interpreter import Template
+
+class TestEscape(unittest.TestCase):
+    def testSpecialCharacters(self):
+        self.assertEqual(escape(u'<a href="x">Tom\'s & Jerry</a>'),
+            u'&lt;a href=&quot;x&quot;&gt;Tom&#39;s &amp; Jerry&lt;/a&gt;')
+
+    def testResultIsSafe(self):
+        self.assertTrue(isinstance(escape(u'plain'), Safe))
+        self.assertTrue(isinstance(escape('<b>'), Safe))
+
+    def testSafeIsNotEscapedAgain(self):
+        s = escape(u'&')
+        self.assertTrue(escape(s) is s)
+        self.assertEqual(escape(escape(u'&')), u'&amp;')
+
+    def testNumbersAreKept(self):
+        self.assertEqual(escape(3), 3)
+        self.assertEqual(escape(True), True)
+
+    def testObjectWithHtml(self):
+        class Markup(object):
+            def __html__(self):
+                return u'<b>x</b>'
+        self.assertEqual(escape(Markup()), u'<b>x</b>')
+
+    def testEscapedValues(self):
+        self.assertTrue(isinstance(escape(u'a&b'), Escaped))
+        self.assertEqual(escape(u'<a href="x">Tom\'s & Jerry</a>').unescape(), u'<a href="x">Tom\'s & Jerry</a>')
+        self.assertEqual(joinArgument([escape(u'a&b'), 3]), u'a&b3')
+        self.assertFalse(isinstance(joinArgument([escape(u'a&b')]), Safe))
+        self.assertEqual(joinArgument([u'<i>', escape(u'&')]), u'<i>&amp;')
+        self.assertTrue(isinstance(joinArgument([u'<i>', escape(u'&')]), Safe))
+
+    def testOperationsKeepSafe(self):
+        bold = Safe(u'<b>%s</b>')
+        self.assertEqual(bold % u'<i>', u'<b>&lt;i&gt;</b>')
+        self.assertEqual(bold % (Safe(u'<i>'),), u'<b><i></b>')
+        self.assertEqual(Safe(u'<br>') + u'&', u'<br>&amp;')
+        self.assertEqual(u'&' + Safe(u'<br>'), u'&amp;<br>')
+        self.assertEqual(Safe(u'<br>').join([u'<', Safe(u'>')]), u'&lt;<br>>')
+        self.assertTrue(isinstance(Safe(u'a') + u'b', Safe))
+        self.assertTrue(isinstance(Safe(u'<b>').upper(), Safe))
+        self.assertTrue(isinstance(Safe(u' <b>')[1:].strip(), Safe))
+        self.assertEqual(Safe(u'<b>x</b>').replace(u'x', u'&'), u'<b>&amp;</b>')
+
+class EscapingTemplate(Template):
+    def mBold(self, content):
+        return Safe(u'<b>%s</b>') % content
+
+    def mQuote(self, content):
+        return u'"%s"' % content
+
+    def mUpper(self, content):
+        return content.upper()
+
+    def mLen(self, content):
+        return len(content)
+
+class TestAutoescape(unittest.TestCase):
+    def render(self, code, **params):
+        res = EscapingTemplate(code, autoescape=True).render(**params)
+        for options in [dict(compiled=True), dict(iterative=True), dict(optimized=True)]:
+            self.assertEqual(EscapingTemplate(code, autoescape=True, **options).render(**params), res)
+        return res
+
+    def testValuesAreEscaped(self):
+        self.assertEqual(self.render(u'<p>[$name]</p>', name=u'<Tom & Jerry>'), u'<p>&lt;Tom &amp; Jerry&gt;</p>')
+
+    def testEscapingIsOptIn(self):
+        self.assertEqual(EscapingTemplate(u'<p>[$name]</p>').render(name=u'<b>'), u'<p><b></p>')
+
+    def testTemplateMarkupIsKept(self):
+        self.assertEqual(self.render(u'[B :=[<b>[#]</b>]][B [<i>x</i>]]'), u'<b><i>x</i></b>')
+
+    def testFunctionResultsAreEscaped(self):
+        self.assertEqual(self.render(u'[$f]', f=lambda ip: u'<x>'), u'&lt;x&gt;')
+        self.assertEqual(self.render(u'[$f]', f=lambda ip: [u'<', u'>']), u'&lt;&gt;')
+
+    def testSafeValuesAreKept(self):
+        self.assertEqual(self.render(u'[$a][$b]', a=Safe(u'<br>'), b=u'<br>'), u'<br>&lt;br&gt;')
+
+    def testNumbers(self):
+        self.assertEqual(self.render(u'[$n]', n=5), u'5')
+
+    def testItemsOfList(self):
+        code = u'<table>[List Seq=[[$rows]] [<tr><td>[$Item.name]</td><td>[$Order]</td></tr>]]</table>'
+        res = self.render(code, rows=[{'name': u'a<b'}, {'name': u'"c"'}])
+        self.assertEqual(res, u'<table><tr><td>a&lt;b</td><td>1</td></tr><tr><td>&quot;c&quot;</td><td>2</td></tr></table>')
+
+    def testMethodsGetMarkup(self):
+        self.assertEqual(self.render(u'[Bold [<i>[$x]</i>]]', x=u'&'), u'<b><i>&amp;</i></b>')
+        #text which is not Safe is escaped
+        self.assertEqual(self.render(u'[Quote [<i>]]'), u'&quot;&lt;i&gt;&quot;')
+
+    def testMethodsTransformValues(self):
+        self.assertEqual(self.render(u'[Upper [[$x]]] [Len [[$x]]]', x=u'a&b'), u'A&amp;B 3')
+        self.assertEqual(self.render(u'[Len [[$x][$y]]] [Len [[Upper [[$x]]]]]', x=u'a&b', y=u'<'), u'4 3')
+        #markup of template stays markup
+        self.assertEqual(self.render(u'[Upper [a&b]] [Len [a&b]]'), u'A&B 3')
+        self.assertEqual(self.render(u'[Upper [<i>[$x]</i>]]', x=u'b'), u'<I>B</I>')
+
+    def testSplitValues(self):
+        code = u'[List Seq=[[Split [[$x]] Sep=[,]]] Sep=[|] [[Upper [[$Item]]]]]'
+        self.assertEqual(self.render(code, x=u'a<b,c'), u'A&lt;B|C')
+        #markup of template stays markup
+        self.assertEqual(self.render(u'[List Seq=[[Split [<i>,[$x]] Sep=[,]]] Sep=[|] [[$Item]]]', x=u'&'), u'<i>|&amp;')
+
+    def testAttributesAreNotEscapedTwice(self):
+        code = u'[html.a href=[[$url]] [[$title]]]'
+        res = self.render(code, url=u'/?a=1&b="2"', title=u'<x>')
+        self.assertEqual(res, u'<a href="/?a=1&amp;b=&quot;2&quot;">&lt;x&gt;</a>')
+
+    def testStreaming(self):
+        template = EscapingTemplate(u'[List Seq=[[$rows]] [[$Item]]]', autoescape=True)
+        self.assertEqual(u''.join(template.render_iter(rows=iter([u'<', u'>']))), u'&lt;&gt;')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,16 @@
 #encoding: utf-8
 
+import itertools
 import re
+import sys
+import tempfile
+import threading
+import time
 import unittest
+from StringIO import StringIO
 from mrkev.interpreter import Template
 from mrkev.parser import Parser
+from mrkev.test.helpers import SAMPLES, CountingTemplate
 
 class TestInterpretation(unittest.TestCase):
     def testPlaceVariable(self):
@@ -23,6 +30,11 @@ class TestInterpretation(unittest.TestCase):
         '''
         self.assertEqual(Template(code).render(Literature=[u'Shakespear', u'Čapek']), u'<ul><li>1. Shakespear</li><li class="last">2. Čapek</li></ul>')
 
+    def testListOfGenerator(self):
+        code = '[List Seq=[[$rows]] Sep=[,] [[$Order]:[$Item.0][If [[$Last]] Then=[.]]]][List Seq=[[$empty]] IfEmpty=[-] [x]]'
+        rows = ((c, i) for i, c in enumerate('abc'))
+        self.assertEqual(Template(code).render(rows=rows, empty=iter([])), '1:a,2:b,3:c.-')
+
     def testList2(self):
         code = '''
         [Link :=[<a href="[#Target]">[#]</a>]]
@@ -82,6 +94,18 @@ class TestInterpretation(unittest.TestCase):
         code = '[$user.nickname]([$user.age])'
         self.assertEqual(Template(code).render(user={'nickname': 'spide', 'age': 26}), 'spide(26)')
 
+    def testContentOfObjects(self):
+        class User(object):
+            nickname = 'spide'
+            def delete(self):
+                pass
+        code = '[$user.nickname] [$user.delete] [$user.__class__]'
+        self.assertEqual(Template(code).render(user=User()), 'spide [$user.delete not found] [$user.__class__ not found]')
+
+    def testContentOfSequences(self):
+        code = '[List Seq=[[$rows]] Sep=[,] [[$Item.0]=[$Item.1.x][$Item.2]]]'
+        self.assertEqual(Template(code).render(rows=[('a', {'x': 1}), ('b', {'x': 2})]), 'a=1[$Item.2 not found],b=2[$Item.2 not found]')
+
     def testComment(self):
         code = 'aaa[*comment[*]bbb'
         self.assertEqual(Template(code).render(), 'aaabbb')
@@ -149,6 +173,245 @@ class TestInterpretation(unittest.TestCase):
         self.assertEqual(res, 'Hello world')
 
 
+class TestStreaming(unittest.TestCase):
+    CODE = '''
+    [Row :=[<li>[Tick [[$Item]]]</li>]]
+    <ul>[List Seq=[[$items]] Sep=[,] [[Row]]]</ul>
+    '''
+
+    class TickingTemplate(Template):
+        def __init__(self, code):
+            Template.__init__(self, code)
+            self.ticks = []
+
+        def mTick(self, content):
+            self.ticks.append(content)
+            return content
+
+    def testSameOutput(self):
+        template = self.TickingTemplate(self.CODE)
+        expected = template.render(items=['a', 'b', 'c'])
+        self.assertEqual(''.join(self.TickingTemplate(self.CODE).render_iter(items=['a', 'b', 'c'])), expected)
+        self.assertEqual(expected, '<ul><li>a</li>,<li>b</li>,<li>c</li></ul>')
+
+    def testOutputIsProducedLazily(self):
+        template = self.TickingTemplate(self.CODE)
+        template.STREAM_BUFFER_SIZE = 1
+        chunks = template.render_iter(items=['a', 'b', 'c'])
+        self.assertEqual(next(chunks), '<ul>')
+        self.assertEqual(template.ticks, [])
+        self.assertEqual(next(chunks), '<li>')
+        self.assertEqual(template.ticks, ['a'])
+        self.assertEqual(''.join(chunks), 'a</li>,<li>b</li>,<li>c</li></ul>')
+        self.assertEqual(template.ticks, ['a', 'b', 'c'])
+
+    def testRenderTo(self):
+        fileobj = StringIO()
+        template = self.TickingTemplate(self.CODE)
+        template.STREAM_ENCODING = None
+        template.render_to(fileobj, items=[u'Č'])
+        self.assertEqual(fileobj.getvalue(), u'<ul><li>Č</li></ul>')
+
+    def testRenderToBinaryFile(self):
+        with tempfile.TemporaryFile() as fileobj:
+            self.TickingTemplate(self.CODE).render_to(fileobj, items=[u'Č'])
+            fileobj.seek(0)
+            self.assertEqual(fileobj.read(), u'<ul><li>Č</li></ul>'.encode('utf-8'))
+        fileobj = StringIO()
+        template = self.TickingTemplate(self.CODE)
+        template.STREAM_ENCODING = 'cp1250'
+        template.render_to(fileobj, items=[u'Č'])
+        self.assertEqual(fileobj.getvalue(), '<ul><li>\xc8</li></ul>')
+
+    def testRenderToParametersNamedAsArguments(self):
+        fileobj = StringIO()
+        code = '<meta charset="[$encoding]">[$fileobj][$self]'
+        Template(code).render_to(fileobj, encoding=u'latin-2', fileobj=u'f', self=u's')
+        self.assertEqual(fileobj.getvalue(), '<meta charset="latin-2">fs')
+
+    def testErrors(self):
+        code = '[a] [c :=c][c]'
+        self.assertEqual(''.join(Template(code).render_iter()), Template(code).render())
+
+    def testSequenceIsReadLazily(self):
+        template = self.TickingTemplate(self.CODE)
+        template.STREAM_BUFFER_SIZE = 1
+        read = []
+        def rows():
+            for i in itertools.count():
+                read.append(i)
+                yield i
+        chunks = template.render_iter(items=rows())
+        self.assertEqual([next(chunks) for i in range(7)], ['<ul>', '<li>', '0', '</li>', ',', '<li>', '1'])
+        self.assertEqual(read, [0, 1, 2])
+
+    def testChunksAreBuffered(self):
+        chunks = list(self.TickingTemplate(self.CODE).render_iter(items=['a'] * 1000))
+        self.assertTrue(len(chunks) < 10)
+
+
+class TestThreadSafety(unittest.TestCase):
+    CODE = '''
+    [Row :=[<li>[#Name]: [Pause [[$Item]]]</li>] Name=[[$name]]]
+    [Page :=[<ul>[#]</ul>]]
+    [Page [[List Seq=[[$items]] [[Row]]]]]
+    '''
+
+    class PausingTemplate(Template):
+        def mPause(self, content):
+            #let other threads run in the middle of rendering
+            time.sleep(0)
+            return content
+
+    def renderConcurrently(self, template, threadCount, renderCount):
+        results = {}
+        def worker(n):
+            results[n] = [template.render(name=str(n), items=range(n, n + 5)) for _ in range(renderCount)]
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(threadCount)]
+        oldInterval = sys.getcheckinterval()
+        sys.setcheckinterval(1)
+        try:
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            sys.setcheckinterval(oldInterval)
+        return results
+
+    def checkTemplate(self, template):
+        results = self.renderConcurrently(template, threadCount=8, renderCount=30)
+        self.assertEqual(len(results), 8)
+        for n, outputs in results.items():
+            expected = '<ul>%s</ul>' % ''.join('<li>%d: %d</li>' % (n, i) for i in range(n, n + 5))
+            self.assertEqual(outputs, [expected] * 30)
+
+    def testInterpreted(self):
+        self.checkTemplate(self.PausingTemplate(self.CODE))
+
+    def testCompiled(self):
+        self.checkTemplate(self.PausingTemplate(self.CODE, compiled=True))
+
+    def testScopesDoNotPileUp(self):
+        template = Template('[$x]')
+        self.assertEqual([template.render(x=i) for i in range(1, 4)], ['1', '2', '3'])
+        self.assertEqual(len(template.createInterpreter({}).blockScopes), 1)
+
+    def testBuiltinsAreSharedByRenders(self):
+        template = CountingTemplate('[Upper [Hi [$x]]][Sp][(][)]')
+        self.assertEqual([template.render(x=i) for i in range(1, 3)], ['HI 1 []', 'HI 2 []'])
+        self.assertEqual(template.builds, 1)
+
+
+def generateChain(depth, wrapper='<div>%s</div>'):
+    definitions = ''.join('[L%d :=[%s]]' % (i, wrapper % ('[L%d]' % (i + 1))) for i in range(depth))
+    return definitions + '[L%d :=[end]][L0]' % depth
+
+class TestStackInterpreter(unittest.TestCase):
+    def testSameOutput(self):
+        for code, params in SAMPLES:
+            expected = Template(code).render(**params)
+            self.assertEqual(Template(code, iterative=True).render(**params), expected)
+            self.assertEqual(''.join(Template(code, iterative=True).render_iter(**params)), expected)
+
+    def testDeepNesting(self):
+        code = generateChain(500)
+        self.assertTrue('recurrence limit' in Template(code).render())
+        self.assertEqual(Template(code, iterative=True).render(), '<div>' * 500 + 'end' + '</div>' * 500)
+
+    def testRecurrenceLimit(self):
+        class LimitedTemplate(Template):
+            RECURRENCE_LIMIT = 10
+        self.assertEqual(LimitedTemplate(generateChain(10), iterative=True).render().count('<div>'), 10)
+        self.assertEqual(LimitedTemplate(generateChain(11), iterative=True).render().count('<div>'), 10)
+        self.assertEqual(Template('[c :=c][c]', iterative=True).render(), '[recurrence limit for c]')
+
+    def testNestedFunctionsAreLimited(self):
+        res = Template(generateChain(300, '[If [x] Then=[<b>%s</b>]]'), iterative=True).render()
+        self.assertTrue('[recurrence limit for If]' in res)
+
+    def testStoppedStreamLeavesScopes(self):
+        template = Template('[a :=[[b]]][b :=[x[$y]]][a][a]', iterative=True)
+        template.STREAM_BUFFER_SIZE = 1
+        ip = template.createInterpreter({'y': 'y'})
+        chunks = ip.iterString(1)
+        self.assertEqual(next(chunks), 'x')
+        chunks.close()
+        self.assertEqual((len(ip.callScopes), len(ip.blockScopes), ip.useCount), (0, 1, 0))
+
+    def testCompiledTemplateIsNotIterative(self):
+        self.assertRaises(ValueError, lambda: Template('x', compiled=True, iterative=True))
+
+
+class LazyTemplate(Template):
+    LAZY_ARGUMENTS = ('Choose', 'Echo', 'Format', 'Fragments', 'Lookup', 'Hash')
+    RAW_ARGUMENTS = ('Fragments', 'Count', 'Hash')
+
+    def __init__(self, *args, **kwargs):
+        self.ticks = 0
+        super(LazyTemplate, self).__init__(*args, **kwargs)
+
+    def mTick(self):
+        self.ticks += 1
+        return u'tick'
+
+    def mChoose(self, flag, yes, no):
+        return yes if flag == u'1' else no
+
+    def mEcho(self, content):
+        return content
+
+    def mFormat(self, content):
+        return u'<%s>' % content + u'|' + 'x%s' % content
+
+    def mFragments(self, content):
+        return [len(content.get())] + content.get()
+
+    def mCount(self, content):
+        return unicode(len(content))
+
+    def mLookup(self, content):
+        return {u'a': u'found'}.get(content, u'missing')
+
+    def mHash(self, content):
+        try:
+            hash(content)
+        except TypeError:
+            return u'unhashable'
+        return u'hashable'
+
+class TestLazyArguments(unittest.TestCase):
+    def testOnlyReadArgumentsAreRendered(self):
+        template = LazyTemplate(u'[Choose flag=[1] yes=[a] no=[[Tick]]][Choose flag=[0] yes=[[Tick]] no=[b]]')
+        self.assertEqual(template.render(), u'ab')
+        self.assertEqual(template.ticks, 0)
+
+    def testArgumentIsRenderedOnce(self):
+        template = LazyTemplate(u'[Format [č[Tick]]]')
+        self.assertEqual(template.render(), u'<čtick>|xčtick')
+        self.assertEqual(template.ticks, 1)
+
+    def testReturnedArgument(self):
+        for options in [{}, dict(compiled=True), dict(iterative=True), dict(autoescape=True)]:
+            template = LazyTemplate(u'[A :=[[Echo [[#]!]]]][A [x]]', **options)
+            self.assertEqual(template.render(), u'x!')
+
+    def testRawFragments(self):
+        template = LazyTemplate(u'[Count [a[$x]b]] [Fragments [a[$x]]]')
+        self.assertEqual(template.render(x=5), u'3 2a5')
+
+    def testHashMatchesEquality(self):
+        template = LazyTemplate(u'[Lookup [a]] [Lookup [b]] [Hash [a]]')
+        self.assertEqual(template.render(), u'found missing unhashable')
+
+    def testSameOutputAsStrings(self):
+        class StringTemplate(LazyTemplate):
+            LAZY_ARGUMENTS = ()
+            RAW_ARGUMENTS = ()
+        code = u'[Choose flag=[[$f]] yes=[[$y]] no=[n]] [Format [[$y]]]'
+        for f in (u'0', u'1'):
+            self.assertEqual(LazyTemplate(code).render(f=f, y=u'y'), StringTemplate(code).render(f=f, y=u'y'))
+
 class TestTagGenerator(unittest.TestCase):
     def testWiki(self):
         RE_WHITESPACE = re.compile(r'[\r\n\t ]+')
@@ -207,6 +470,11 @@ class TestTagGenerator(unittest.TestCase):
         res = Template(code).render()
         self.assertEqual(res, '<a href="http://www.example.com" title="Example Title"/>')
 
+    def testAttributeEscaping(self):
+        code = u'[html.a title=[it\'s "<b>" & more] [x]]'
+        res = Template(code).render()
+        self.assertEqual(res, u'<a title="it\'s &quot;&lt;b&gt;&quot; &amp; more">x</a>')
+
     def testInvalidTagName(self):
         code = '[html.a:b:c]'
         res = Template(code).render()
@@ -0,0 +1,103 @@
+#encoding: utf-8
+
+import os
+import shutil
+import tempfile
+import unittest
+from mrkev.loader import TemplateLoader, TemplateNotFound
+from mrkev.parser import MarkupSyntaxError
+
+class TestTemplateLoader(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, content, mtime=1000000000):
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as f:
+            f.write(content.encode('utf-8'))
+        os.utime(path, (mtime, mtime))
+
+    def testLoad(self):
+        self.write('page', u'Hello [$name]!')
+        loader = TemplateLoader(self.directory)
+        self.assertEqual(loader.get('page').render(name=u'světe'), u'Hello světe!')
+
+    def testCachedTemplateIsReused(self):
+        self.write('page', u'a')
+        loader = TemplateLoader(self.directory)
+        self.assertTrue(loader.get('page') is loader.get('page'))
+        self.assertEqual((loader.hits, loader.misses, loader.reloads), (1, 1, 0))
+
+    def testModifiedTemplateIsReloaded(self):
+        self.write('page', u'a')
+        loader = TemplateLoader(self.directory)
+        first = loader.get('page')
+        self.write('page', u'b', mtime=1000000001)
+        second = loader.get('page')
+        self.assertFalse(first is second)
+        self.assertEqual(second.render(), 'b')
+        self.assertEqual(loader.reloads, 1)
+
+    def testHashValidationIgnoresTouch(self):
+        self.write('page', u'a')
+        loader = TemplateLoader(self.directory, validation='hash')
+        first = loader.get('page')
+        self.write('page', u'a', mtime=1000000001)
+        self.assertTrue(loader.get('page') is first)
+        self.write('page', u'c', mtime=1000000001)
+        self.assertEqual(loader.get('page').render(), 'c')
+        self.assertEqual((loader.hits, loader.misses, loader.reloads), (1, 1, 1))
+
+    def testEviction(self):
+        for name in 'abc':
+            self.write(name, name)
+        loader = TemplateLoader(self.directory, maxSize=2)
+        a = loader.get('a')
+        loader.get('b')
+        loader.get('a')
+        loader.get('c')
+        self.assertTrue(loader.get('a') is a)
+        loader.get('b')
+        statistics = loader.getStatistics()
+        self.assertEqual(statistics['size'], 2)
+        self.assertEqual(statistics['evictions'], 2)
+        self.assertEqual((statistics['hits'], statistics['misses']), (2, 4))
+
+    def testNotFound(self):
+        loader = TemplateLoader(self.directory)
+        self.assertRaises(TemplateNotFound, lambda: loader.get('missing'))
+        self.assertRaises(TemplateNotFound, lambda: loader.get('../page'))
+
+    def testSyntaxErrorContainsFileName(self):
+        self.write('broken', u'[a')
+        loader = TemplateLoader(self.directory)
+        try:
+            loader.get('broken')
+        except MarkupSyntaxError as e:
+            self.assertEqual(e.inputFile.name, os.path.join(self.directory, 'broken'))
+        else:
+            self.fail('error expected')
+
+    def testUnknownValidation(self):
+        self.assertRaises(ValueError, lambda: TemplateLoader(self.directory, validation='size'))
+
+    def testProgramCache(self):
+        self.write('page', u'[a :=[<[#]>]][a [[$x]]]')
+        cacheDirectory = os.path.join(self.directory, '__mrkevcache__')
+        TemplateLoader(self.directory, cacheDirectory=cacheDirectory).get('page')
+        loader = TemplateLoader(self.directory, cacheDirectory=cacheDirectory)
+        self.assertEqual(loader.get('page').render(x='y'), '<y>')
+        self.assertEqual(loader.programCache.hits, 1)
+
+    def testProgramCacheKeepsFileNames(self):
+        for name in ['a', 'b']:
+            self.write(name, u'[x]')
+        cacheDirectory = os.path.join(self.directory, '__mrkevcache__')
+        TemplateLoader(self.directory, cacheDirectory=cacheDirectory).get('a')
+        loader = TemplateLoader(self.directory, cacheDirectory=cacheDirectory)
+        for name in ['a', 'b']:
+            span = loader.get(name).program.span
+            self.assertEqual(span.filename, os.path.join(self.directory, name))
@@ -0,0 +1,155 @@
+import unittest
+from mrkev.interpreter import Template
+from mrkev.test.helpers import CountingTemplate
+
+class CardTemplate(CountingTemplate):
+    MEMOIZED_BLOCKS = ('Card',)
+
+class SharedTemplate(CardTemplate):
+    SHARED_MEMO_SIZE = 10
+
+class TestMemo(unittest.TestCase):
+    def testSameArgumentsAreRenderedOnce(self):
+        template = CardTemplate('[Card :=[[Tick]<b>[#Name]</b>]][Card Name=[a]][Card Name=[a]][Card Name=[a]]')
+        self.assertEqual(template.render(), '<b>a</b><b>a</b><b>a</b>')
+        self.assertEqual(template.calls, 1)
+        self.assertEqual(template.memo.getStatistics()['hits'], 2)
+
+    def testDifferentArguments(self):
+        template = CardTemplate('[Card :=[[Tick][#Name]]][Card Name=[a]][Card Name=[b]][Card Name=[[(]a[)]]]')
+        self.assertEqual(template.render(), 'ab[a]')
+        self.assertEqual(template.calls, 3)
+
+    def testEvaluatedArgumentsAreCompared(self):
+        template = CardTemplate('[Card :=[[Tick][#Name]]][Card Name=[a]][Card Name=[[$x]]]')
+        self.assertEqual(template.render(x='a'), 'aa')
+        self.assertEqual(template.calls, 1)
+
+    def testFragmentsOfArgumentsAreCompared(self):
+        code = ('[Card :=[[List Seq=[[#Seq]] Sep=[|] [<[$Item]>]]]]'
+            '[Card Seq=[[Split [a,b] Sep=[,]]]] [Card Seq=[ab]]')
+        self.assertEqual(CardTemplate(code).render(), '<a>|<b> <ab>')
+
+    def testChangedContextValue(self):
+        code = '[Card :=[[Tick][$Item]]][List Seq=[[$items]] [[Card]]]'
+        template = CardTemplate(code)
+        self.assertEqual(template.render(items=['a', 'b', 'a']), 'aba')
+        self.assertEqual(template.calls, 2)
+        stats = template.memo.getStatistics()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 2))
+
+    def testNestedReadsInvalidateOuterBlock(self):
+        code = '[Inner :=[[$Item]]][Card :=[[Tick][Inner]]][List Seq=[[$items]] [[Card]]]'
+        template = CardTemplate(code)
+        self.assertEqual(template.render(items=['a', 'b', 'c']), 'abc')
+        self.assertEqual(template.calls, 3)
+
+    def testBlocksFoundByDynamicScoping(self):
+        code = '[Inner :=[in]][Outer :=[[Inner :=[IN]][#]]][Card :=[[Tick]<[Inner]>]][Card][Outer [[Card]]][Card]'
+        self.assertEqual(CountingTemplate(code).render(), '<in><IN><in>')
+        for options in [{}, dict(compiled=True), dict(iterative=True)]:
+            template = CardTemplate(code, **options)
+            self.assertEqual(template.render(), '<in><IN><in>')
+            self.assertEqual(template.calls, 2)
+
+    def testArgumentsAreEvaluatedOnce(self):
+        for options in [{}, dict(compiled=True), dict(iterative=True)]:
+            template = CardTemplate('[Card :=[<[#]>]][Card [[Tick]a]]', **options)
+            self.assertEqual(template.render(), '<a>')
+            self.assertEqual(template.calls, 1)
+
+    def testArgumentsSeeDefinitionsOfBlock(self):
+        code = '[Inner :=[x]][Other :=[x]][Card :=[[Inner :=[IN]]<[#]>]][Card [[Inner]]] [Card [[Other]]]'
+        self.assertEqual(CountingTemplate(code).render(), '<IN> <x>')
+        for options in [{}, dict(compiled=True), dict(iterative=True)]:
+            self.assertEqual(CardTemplate(code, **options).render(), '<IN> <x>')
+
+    def testArgumentsReadingNamesPushedByBlock(self):
+        code = '[Card :=[[List Seq=[[$xs]] [<[#]>]]]][Card [[$Item]]] [Card [[$y]]] [List Seq=[[$ys]] [[Card [[$Item]]]]]'
+        params = dict(xs=['a', 'b'], y='a', ys=['a'])
+        expected = CountingTemplate(code).render(**params)
+        self.assertEqual(expected, '<a><b> <a><a> <a><b>')
+        for options in [{}, dict(compiled=True), dict(iterative=True)]:
+            self.assertEqual(CardTemplate(code, **options).render(**params), expected)
+
+    def testRendersDoNotShareByDefault(self):
+        template = CardTemplate('[Card :=[[Tick]x]][Card]')
+        template.render()
+        template.render()
+        self.assertEqual(template.calls, 2)
+
+    def testSharedCache(self):
+        template = SharedTemplate('[Card :=[[Tick][$x]]][Card]')
+        self.assertEqual(template.render(x='a'), 'a')
+        self.assertEqual(template.render(x='a'), 'a')
+        self.assertEqual(template.render(x='b'), 'b')
+        self.assertEqual(template.render(x='a'), 'a')
+        self.assertEqual(template.calls, 2)
+        stats = template.memo.getStatistics()
+        self.assertEqual(stats['sharedHits'], 2)
+        self.assertEqual(stats['hitRate'], 0.5)
+
+    def testMissingContextValue(self):
+        template = SharedTemplate('[Card :=[[Tick][$x]]][Card]')
+        self.assertEqual(template.render(), '[$x not found]')
+        self.assertEqual(template.render(x='a'), 'a')
+        self.assertEqual(template.calls, 2)
+
+    def testSameOutputAsWithoutMemo(self):
+        code = '''[Row :=[<tr>[List Seq=[[Split [#Cells] Sep=[,]]] [<td>[$Item]</td>]]</tr>]]
+            [List Seq=[[$rows]] [[Row Cells=[[$Item]]]]]'''
+        class MemoTemplate(Template):
+            MEMOIZED_BLOCKS = ('Row',)
+        rows = ['a,b', 'c', 'a,b']
+        for compiled in (False, True):
+            template = MemoTemplate(code, compiled=compiled)
+            self.assertEqual(template.render(rows=rows), Template(code).render(rows=rows))
+            self.assertEqual(template.memo.getStatistics()['hits'], 1)
+
+class Loader(object):
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self, ip):
+        self.calls += 1
+        return self.value
+
+class TestValueMemo(unittest.TestCase):
+    CODE = u'[$user.name] <[$user.email]> [List Seq=[[$rows]] [[$Order].[$Item][If [[$Last]] Else=[,]][$user.name]]]'
+
+    def testLoaderIsCalledOncePerRender(self):
+        for options in [{}, dict(compiled=True), dict(iterative=True)]:
+            template = Template(self.CODE, memoizeValues=True, **options)
+            user = Loader({'name': u'joe', 'email': u'joe@example.com'})
+            res = template.render(user=user, rows=['a', 'b'])
+            self.assertEqual(res, u'joe <joe@example.com> 1.a,joe2.bjoe')
+            self.assertEqual(user.calls, 1)
+            template.render(user=user, rows=['a', 'b'])
+            self.assertEqual(user.calls, 2)
+            self.assertEqual(template.valueMemo.getStatistics(), {'calls': 2, 'saved': 6})
+
+    def testWithoutMemo(self):
+        user = Loader({'name': u'joe', 'email': u'joe@example.com'})
+        template = Template(self.CODE)
+        self.assertEqual(template.render(user=user, rows=['a', 'b']), u'joe <joe@example.com> 1.a,joe2.bjoe')
+        self.assertEqual(user.calls, 4)
+        self.assertTrue(template.valueMemo is None)
+
+    def testLoaderReadingArguments(self):
+        link = lambda ip: u'<%s>' % ip.getString('#href')
+        code = u'[$link href=[a]] [$link href=[b]] [$link] [$link]'
+        for options in [{}, dict(compiled=True), dict(iterative=True)]:
+            template = Template(code, memoizeValues=True, **options)
+            self.assertEqual(template.render(link=link), u'<a> <b> <> <>')
+            self.assertEqual(template.valueMemo.getStatistics(), {'calls': 3, 'saved': 1})
+
+    def testGeneratorIsReadMoreTimes(self):
+        template = Template(u'[List Seq=[[$rows]] [[$Item]]]|[$rows]', memoizeValues=True)
+        self.assertEqual(template.render(rows=lambda ip: (x for x in 'abc')), u'abc|abc')
+
+    def testMissingPath(self):
+        code = u'[$user.phone]|[$user.name.first]|[$user.0]'
+        user = {'name': u'joe'}
+        self.assertEqual(Template(code, memoizeValues=True).render(user=Loader(user)),
+            Template(code).render(user=Loader(user)))
@@ -0,0 +1,120 @@
+import unittest
+import random
+from mrkev.interpreter import Template
+from mrkev.resolver import iterNodes
+from mrkev.translator import CallBlock
+
+class TestOptimizer(unittest.TestCase):
+    def testFoldContextConstants(self):
+        template = Template('[(]a[Sp]b[)]', optimized=True)
+        self.assertEqual(template.program, '[a b]')
+        self.assertEqual(template.optimizerStatistics, {'folded': 3, 'merged': 4})
+
+    def testFoldDefinitionWithoutParameters(self):
+        template = Template('[Home :=[[html.a href=[/] [Home]]]][Home] and [Home]', optimized=True)
+        self.assertEqual(template.program.content, '<a href="/">Home</a> and <a href="/">Home</a>')
+
+    def testKeepDynamicBlocks(self):
+        code = '[Link :=[[html.a href=#Target #]]][Link Target=[/] [[$name]]][Greeting]'
+        template = Template(code, optimized=True)
+        self.assertEqual(template.optimizerStatistics['folded'], 0)
+        self.assertEqual(template.render(name='x'), '<a href="/">x</a>[Greeting not found]')
+
+    def testKeepMethods(self):
+        class TestingTemplate(Template):
+            def mNow(self):
+                return 'now'
+        template = TestingTemplate('[Now]', optimized=True)
+        self.assertEqual(template.optimizerStatistics['folded'], 0)
+
+    def testKeepRedefinedBlocks(self):
+        code = '[a :=[x]][b :=[[a :=[y]][#]]][a][b [[a]]]'
+        template = Template(code, optimized=True)
+        self.assertEqual(template.render(), 'xy')
+
+    def testFragmentsOfFunctionsAreKept(self):
+        code = '[List Seq=[[Split [a$b$c] Sep=[$]]] Sep=[_] [[$Item]]]'
+        template = Template(code, optimized=True)
+        self.assertEqual(template.optimizerStatistics['folded'], 1)
+        self.assertEqual(template.render(), 'a_b_c')
+
+    def testEmptyParameterStaysDefined(self):
+        code = '[a :=[[#x]] x=[default]][a x=[[If [] Then=[y]]]]'
+        self.assertEqual(Template(code, optimized=True).render(), Template(code).render())
+
+    def testCompiled(self):
+        code = '[Row :=[<tr>[html.td [[Sp]]][#]</tr>]][Row [[$x]]]'
+        self.assertEqual(Template(code, optimized=True, compiled=True).render(x='y'), '<tr><td> </td>y</tr>')
+
+class SpecializedTemplate(Template):
+    PURE_NAMES = Template.PURE_NAMES | frozenset(['Upper'])
+
+    def mUpper(self, content):
+        return content.upper()
+
+#pieces of generated templates, $s* are static and $d* dynamic parameters
+PIECES = [
+    u'text ', u'[$s1]', u'[$s2]', u'[$d1]', u'[$s3.name]', u'[Sp]', u'[Upper [[$s1]]]', u'[Upper [[$d1]]]',
+    u'[If [[$flag]] Then=[[$s2]] Else=[[$d1]]]', u'[List Seq=[[$items]] Sep=[,] [[$Item][$s1]]]',
+    u'[Box [[$s2]]]', u'[Box [[$d2]]]', u'[html.b class=[[$s1]] [[$d2]]]', u'[Length [[$items]]]',
+    u'<p>[$s2]</p>', u'<b>[$d1]</b>', u'[List Seq=[[$items]] [[Upper [[$Item]]]]]',
+]
+STATIC = [
+    dict(s1=u'a', s2=u'<b>', s3={'name': u'n'}, flag=True, items=[1, 2]),
+    dict(s1=u'', s2=u'x', s3={'name': u''}, flag=False, items=[]),
+    dict(s1=u'a&b', s2=u'<i>', s3={'name': u'<n>'}, flag=True, items=[u'x&y', u'<i>']),
+]
+DYNAMIC = [dict(d1=u'd', d2=u'e'), dict(d1=u'', d2=u'&')]
+
+class TestSpecialize(unittest.TestCase):
+    def testSameOutputAsRender(self):
+        rnd = random.Random(23)
+        for i in range(150):
+            code = u'[Box :=[<i>[#]</i>]]' + u''.join(rnd.choice(PIECES) for j in range(rnd.randint(1, 6)))
+            options = rnd.choice([{}, dict(optimized=True), dict(compiled=True), dict(autoescape=True)])
+            template = SpecializedTemplate(code, **options)
+            static = dict((k, v) for k, v in rnd.choice(STATIC).items() if rnd.random() < 0.7)
+            specialized = template.specialize(**static)
+            for dynamic in DYNAMIC:
+                expected = template.render(**dict(static, **dynamic))
+                self.assertEqual(specialized.render(**dynamic), expected, (code, options, static, dynamic))
+
+    def testStaticBlocksAreFolded(self):
+        template = SpecializedTemplate(u'[Title :=[<h1>[$site]</h1>]][Title] [Upper [[$site]]] [$user]')
+        specialized = template.specialize(site=u'web')
+        calls = [node.name for node in iterNodes(specialized.program.content) if isinstance(node, CallBlock)]
+        self.assertEqual(calls, ['$user'])
+        self.assertEqual(specialized.render(user=u'joe'), u'<h1>web</h1> WEB joe')
+        #original template is not changed
+        self.assertEqual(template.render(site=u'x', user=u'y'), u'<h1>x</h1> X y')
+
+    def testStaticNamesCannotBeOverridden(self):
+        specialized = Template(u'[$a][$b]').specialize(a=u'1')
+        self.assertEqual(specialized.render(b=u'2'), u'12')
+        self.assertRaises(ValueError, lambda: specialized.render(a=u'9'))
+        self.assertRaises(ValueError, lambda: specialized.specialize(a=u'9'))
+
+    def testEscapedValueNextToMarkup(self):
+        template = Template(u'<p>[$name]</p><b>[$x]</b>', autoescape=True)
+        specialized = template.specialize(name=u'A&')
+        self.assertEqual(specialized.render(x=u'y'), u'<p>A&amp;</p><b>y</b>')
+        self.assertEqual(specialized.render(x=u'y'), template.render(name=u'A&', x=u'y'))
+
+    def testSpecializeAgain(self):
+        specialized = Template(u'[$a][$b][$c]').specialize(a=u'1').specialize(b=u'2')
+        self.assertEqual(specialized.staticParams, {'a': u'1', 'b': u'2'})
+        self.assertEqual(specialized.render(c=u'3'), u'123')
+
+    def testScopeNamesAreNotStatic(self):
+        specialized = Template(u'[List Seq=[[$rows]] [[$Item]]]').specialize(Item=u'x', rows=[1, 2])
+        self.assertEqual(specialized.render(), u'12')
+
+    def testCallablesAreNotFolded(self):
+        values = iter([u'a', u'b'])
+        specialized = Template(u'[$f]').specialize(f=lambda ip: next(values))
+        self.assertEqual(specialized.optimizerStatistics['folded'], 0)
+        self.assertEqual([specialized.render(), specialized.render()], [u'a', u'b'])
+
+    def testRenderMany(self):
+        specialized = Template(u'[$a]-[$b]').specialize(a=u'x')
+        self.assertEqual(list(specialized.render_many([{'b': u'1'}, {'b': u'2'}], workers=2)), [u'x-1', u'x-2'])
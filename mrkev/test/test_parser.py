@@ -1,5 +1,8 @@
+import random
 import unittest
-from mrkev.parser import Parser, MarkupBlock as use, MarkupSyntaxError
+from mrkev.parser import Parser, MarkupBlock as use, MarkupSyntaxError, SourceSpan
+from mrkev.interpreter import Template
+from mrkev.translator import CallBlock
 
 def parse(s):
     return Parser(s).parse()
@@ -59,3 +62,134 @@ class TestParsing(unittest.TestCase):
     def testParameterDeclaredTwice(self):
         self.assertRaises(MarkupSyntaxError, lambda: parse('[a b=[] b=[]]'))
 
+
+    def testErrorPosition(self):
+        try:
+            parse('first line\n[a b=[x]] c]\n')
+        except MarkupSyntaxError as e:
+            self.assertEqual((e.inputFile.lineno, e.inputFile.line, e.inputFile.pos), (1, '[a b=[x]] c]\n', 11))
+        else:
+            self.fail('error expected')
+
+    def testErrorAtEndOfFile(self):
+        try:
+            parse('[a\n[b')
+        except MarkupSyntaxError as e:
+            self.assertEqual((e.inputFile.lineno, e.inputFile.line, e.inputFile.pos), (1, '[b', 1))
+        else:
+            self.fail('error expected')
+
+    def testSourceSpans(self):
+        code = 'x\n[a b=[[c]] [d]]\n  [e #f g=h]'
+        blocks = Parser(code, 'page.mrkev').parse()
+        a, e = blocks[1], blocks[3]
+        self.assertEqual(a.span, SourceSpan('page.mrkev', 2, 2, 17))
+        self.assertEqual(code[a.span.start:a.span.end], '[a b=[[c]] [d]]')
+        self.assertEqual(a.params['b'][0].span, SourceSpan('page.mrkev', 2, 8, 11))
+        self.assertEqual((e.span.line, code[e.span.start:e.span.end]), (3, '[e #f g=h]'))
+        #shortcuts span their names
+        self.assertEqual(code[e.params['#'][0].span.start:e.params['#'][0].span.end], '#f')
+        self.assertEqual(code[e.params['g'][0].span.start:e.params['g'][0].span.end], 'h')
+
+def spans(blocks):
+    res = []
+    for block in blocks:
+        if isinstance(block, use):
+            res.append((block.name, block.span))
+            for name, value in sorted(block.params.items()):
+                res.append(spans(value))
+    return res
+
+def programSpans(node):
+    res = []
+    if isinstance(node, list):
+        for child in node:
+            res.extend(programSpans(child))
+    elif isinstance(node, CallBlock):
+        res.append((node.name, node.span.line, node.span.start, node.span.end))
+        for name, value in sorted(node.params.items()):
+            res.extend(programSpans(value))
+    return res
+
+def edit(text, offset, deleted, inserted):
+    return text[:offset] + inserted + text[offset + deleted:]
+
+LIBRARY = u'\n'.join(u'[Row%d :=[<td>[#]</td>]] [*note*]\n[Row%d [[$x]] a=[b]] text' % (i, i) for i in range(20))
+
+class TestReparse(unittest.TestCase):
+    def reparse(self, text, offset, deleted, inserted):
+        previous = Parser(text, 'lib.mrkev').parse()
+        newText = edit(text, offset, deleted, inserted)
+        blocks = Parser(newText, 'lib.mrkev').reparse(previous, offset, deleted, inserted)
+        expected = Parser(newText, 'lib.mrkev').parse()
+        self.assertEqual(blocks, expected)
+        self.assertEqual(spans(blocks), spans(expected))
+        return previous, blocks
+
+    def testUnchangedBlocksAreReused(self):
+        offset = LIBRARY.index(u'Row10 [[$x]]') + 3
+        previous, blocks = self.reparse(LIBRARY, offset, 2, u'1 x=[\n]')
+        self.assertEqual(len(blocks), len(previous))
+        changed = [i for i, (a, b) in enumerate(zip(previous, blocks)) if a is not b and isinstance(a, use)]
+        self.assertEqual(len(changed), 1)
+        self.assertEqual(blocks[changed[0]].name, u'Row1')
+
+    def testRandomEdits(self):
+        rnd = random.Random(25)
+        pieces = [u'[', u']', u'x', u' ', u'\n', u'=[', u'[a]', u'[*', u'*]', u'[b c=[d]]', u'']
+        for i in range(300):
+            offset = rnd.randint(0, len(LIBRARY))
+            deleted = rnd.randint(0, min(8, len(LIBRARY) - offset))
+            inserted = u''.join(rnd.choice(pieces) for j in range(rnd.randint(0, 2)))
+            try:
+                self.reparse(LIBRARY, offset, deleted, inserted)
+            except MarkupSyntaxError:
+                self.assertRaises(MarkupSyntaxError, lambda: parse(edit(LIBRARY, offset, deleted, inserted)))
+
+    def testEditsAtBoundaries(self):
+        text = u'a[x]b[y c=[d]]'
+        for offset, deleted, inserted in [(0, 0, u'z'), (1, 0, u'[w]'), (4, 0, u'[w] '), (5, 0, u'q'), (4, 1, u''),
+                (14, 0, u'end'), (0, 14, u'[new]'), (1, 3, u''), (11, 1, u'\n[e]\n')]:
+            self.reparse(text, offset, deleted, inserted)
+
+    def testSuccessiveEdits(self):
+        rnd = random.Random(7)
+        pieces = [u']', u'x', u'\n', u'[a]', u'[b c=[d\n]]', u'[*', u'*]', u'']
+        text = LIBRARY
+        blocks = parse(text)
+        for i in range(200):
+            offset = rnd.randint(0, len(text))
+            deleted = rnd.randint(0, min(8, len(text) - offset))
+            inserted = u''.join(rnd.choice(pieces) for j in range(rnd.randint(0, 2)))
+            newText = edit(text, offset, deleted, inserted)
+            try:
+                expected = Parser(newText, '<stdin>').parse()
+            except MarkupSyntaxError:
+                continue
+            blocks = Parser(newText).reparse(blocks, offset, deleted, inserted)
+            self.assertEqual(blocks, expected)
+            self.assertEqual(spans(blocks), spans(expected))
+            text = newText
+
+    def testLivePreview(self):
+        text = u'[ul :=[[Item :=[<li>[#]</li>]]<ul>[#]</ul>]][ul [ [.] a [.] b ]] x'
+        blocks = parse(text)
+        self.assertEqual(Template(blocks).render(), u'<ul><li>a</li><li>b</li></ul> x')
+        blocks = Parser(text + u'!').reparse(blocks, len(text), 0, u'!')
+        self.assertEqual(Template(blocks).render(), u'<ul><li>a</li><li>b</li></ul> x!')
+
+    def testTranslatedSpansDoNotMove(self):
+        text = u'[a]\n[b c=[[d]]]'
+        blocks = Parser(text, 'page.mrkev').parse()
+        template = Template(blocks)
+        before = programSpans(template.program)
+        Parser(u'\n\n' + text, 'page.mrkev').reparse(blocks, 0, 0, u'\n\n')
+        self.assertEqual(blocks[-1].params['c'][0].span, SourceSpan('page.mrkev', 4, 12, 15))
+        self.assertEqual(programSpans(template.program), before)
+        self.assertEqual(before, [('a', 1, 0, 3), ('b', 2, 4, 15), ('d', 2, 10, 13)])
+
+    def testBrokenBracketsAreReported(self):
+        text = u'[a][b][c]'
+        previous = parse(text)
+        self.assertRaises(MarkupSyntaxError, lambda: Parser(u'[a][b[c]').reparse(previous, 5, 1, u''))
+
@@ -0,0 +1,99 @@
+#encoding: utf-8
+
+import unittest
+from StringIO import StringIO
+from mrkev.interpreter import Interpreter, Template
+from mrkev.parser import Parser
+from mrkev.profiler import RenderProfile
+
+class TickingClock(object):
+    ''' every reading of the clock takes one second
+    '''
+    def __init__(self):
+        self.time = 0
+
+    def __call__(self):
+        self.time += 1
+        return float(self.time)
+
+class ProfiledTemplate(Template):
+    def mUpper(self, content):
+        return content.upper()
+
+CODE = u'''[Row :=[<li>[Upper #]</li>]][html.ul [[List Seq=[[$items]] [[Row [[$Item]]]]]]]'''
+
+class TestProfile(unittest.TestCase):
+    def testSameOutput(self):
+        for options in [{}, dict(compiled=True), dict(iterative=True)]:
+            template = ProfiledTemplate(CODE, **options)
+            output, profile = template.render_profile(items=['a', 'b'])
+            self.assertEqual(output, template.render(items=['a', 'b']))
+
+    def testBlocksAndFunctionsAreCounted(self):
+        for options in [{}, dict(compiled=True), dict(iterative=True)]:
+            output, profile = ProfiledTemplate(CODE, **options).render_profile(items=[u'a', u'č'])
+            stats = profile.getStatistics()
+            self.assertEqual(output, u'<ul><li>A</li><li>Č</li></ul>')
+            self.assertEqual(stats['Row']['calls'], 2)
+            self.assertEqual(stats['Upper']['calls'], 2)
+            self.assertEqual(stats['List']['calls'], 1)
+            self.assertEqual(stats['html.ul']['calls'], 1)
+            self.assertEqual(stats['$Item']['calls'], 2)
+            self.assertEqual(stats['Row']['bytes'], 21)
+            self.assertEqual(stats['html.ul']['bytes'], len(output.encode('utf-8')))
+
+    def testInclusiveAndExclusiveTime(self):
+        ip = ProfiledTemplate(u'[A :=[[B][B]]][B :=[[C]]][C :=[c]][A]').createInterpreter({})
+        profile = RenderProfile(TickingClock())
+        profile.attach(ip)
+        self.assertEqual(ip.evalToString(), 'cc')
+        stats = profile.getStatistics()
+        #every call reads the clock twice, C takes 1s, B 3s and A 9s
+        self.assertEqual((stats['C']['inclusive'], stats['C']['exclusive']), (2.0, 2.0))
+        self.assertEqual((stats['B']['inclusive'], stats['B']['exclusive']), (6.0, 4.0))
+        self.assertEqual((stats['A']['inclusive'], stats['A']['exclusive']), (9.0, 3.0))
+
+    def testRecursionIsCountedOnce(self):
+        ip = Template(u'[R :=[[If # Then=[[R]]]]][R [x]]').createInterpreter({})
+        profile = RenderProfile(TickingClock())
+        profile.attach(ip)
+        ip.evalToString()
+        stats = profile.getStatistics()
+        #outer R encloses If, which encloses inner R and If, they are counted once
+        self.assertEqual(stats['R']['calls'], 2)
+        self.assertEqual(stats['If']['calls'], 2)
+        self.assertEqual(stats['R']['inclusive'], stats['If']['inclusive'] + 2)
+        total = sum(s['exclusive'] for s in stats.values())
+        self.assertEqual(stats['R']['inclusive'], total)
+
+    def testFormat(self):
+        output, profile = ProfiledTemplate(CODE).render_profile(items=['a'])
+        lines = profile.format(limit=2).splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith('block'))
+
+    def testCollapsedStacks(self):
+        code = u'[A :=[\n[B]]][B :=[b]]\n[A][A]'
+        ip = Template(Parser(code, 'page.mrkev').parse()).createInterpreter({})
+        profile = RenderProfile(TickingClock())
+        profile.attach(ip)
+        ip.evalToString()
+        output = StringIO()
+        profile.writeCollapsed(output)
+        self.assertEqual(output.getvalue().splitlines(), [
+            'A (page.mrkev:3) 4000000',
+            'A (page.mrkev:3);B (page.mrkev:2) 2000000',
+        ])
+
+    def testRenderWithoutProfileIsNotInstrumented(self):
+        for options in [{}, dict(compiled=True), dict(iterative=True)]:
+            template = ProfiledTemplate(CODE, **options)
+            ip = template.createInterpreter({'items': ['a']})
+            self.assertTrue(ip.profile is None)
+            #class methods are called directly, no measuring wrapper is installed
+            self.assertFalse('evalCallBlock' in vars(ip))
+            self.assertTrue(ip.evalCallBlock.__func__ is Interpreter.evalCallBlock.__func__)
+            self.assertEqual(template.render(items=['a']), '<ul><li>A</li></ul>')
+
+if __name__ == '__main__':
+    unittest.main()
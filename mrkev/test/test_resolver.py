@@ -0,0 +1,67 @@
+import unittest
+from mrkev.parser import Parser
+from mrkev.resolver import GLOBAL, Resolver
+from mrkev.translator import Translator
+from mrkev.interpreter import Template
+
+def resolve(code):
+    program = Translator().translate(Parser(code).parse())
+    Resolver().resolve(program)
+    return program
+
+class ImportingTemplate(Template):
+    def _getTemplateFunctions(self):
+        functions = super(ImportingTemplate, self)._getTemplateFunctions()
+        functions['Import'] = self.Import
+        return functions
+
+    def Import(self, ip):
+        ip.addBlockScope({'Greeting': [u'imported'], 'Sp': [u'_']})
+        try:
+            return ip.getValue('#', [])
+        finally:
+            ip.removeBlockScope()
+
+OPTIONS = [{}, dict(compiled=True), dict(iterative=True), dict(optimized=True), dict(optimized=True, compiled=True)]
+
+class TestResolver(unittest.TestCase):
+    def testBindDefinition(self):
+        program = resolve('[a :=x][a]')
+        self.assertTrue(program.content.binding is program.params['a'])
+
+    def testBindGlobal(self):
+        program = resolve('[If [x]]')
+        self.assertTrue(program.binding is GLOBAL)
+
+    def testContextParameterIsDynamic(self):
+        program = resolve('[$name]')
+        self.assertEqual(program.binding, None)
+
+    def testRedefinedNameIsDynamic(self):
+        program = resolve('[a :=[[b :=x][b]]][b :=y][b]')
+        self.assertEqual(program.content.binding, None)
+
+    def testDefinitionOutsideLexicalScopeIsDynamic(self):
+        #Item is defined by ul and visible to its content
+        program = resolve('[ul :=[[Item :=[x]][#]]][ul [[Item]]]')
+        self.assertEqual(program.content.params['#'].binding, None)
+        self.assertEqual(Template('[ul :=[[Item :=[x]][#]]][ul [[Item]]]').render(), 'x')
+
+    def testGlobalNamePushedByTemplateFunction(self):
+        code = '[Import [[Greeting][Sp]]][Sp][Greeting]'
+        for options in OPTIONS:
+            res = ImportingTemplate(code, **options).render()
+            self.assertEqual(res, 'imported_ [Greeting not found]')
+
+    def testDefinitionShadowedByTemplateFunction(self):
+        code = '[Greeting :=[local]][Hello :=[<[Greeting]>]][Import [[Greeting][Hello]]] [Greeting][Hello]'
+        for options in OPTIONS:
+            res = ImportingTemplate(code, **options).render()
+            self.assertEqual(res, 'imported<imported> local<local>')
+
+    def testParameterSlot(self):
+        program = resolve('[a :=#x x=[y]][b :=#]')
+        slots = set([program.params['a'].slot, program.params['b'].slot])
+        self.assertEqual(len(slots), 2)
+        self.assertFalse(0 in slots)
+        self.assertEqual(program.params['a'].content.slot, program.params['a'].slot)
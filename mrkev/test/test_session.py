@@ -0,0 +1,65 @@
+import unittest
+from mrkev.interpreter import Template
+from mrkev.test.helpers import RENDER_OPTIONS, CountingTemplate
+
+CODE = u'[Row :=[<li>[Upper #]</li>]]<h1>[Upper [[$title]]]</h1><p>[$user.name]</p><ul>[List Seq=[[$items]] [[Row [[$Item]]]]]</ul>'
+
+PARAMS = [
+    dict(title=u'a', user={'name': u'joe'}, items=[u'x', u'y']),
+    dict(title=u'a', user={'name': u'joe'}, items=[u'x', u'y']),
+    dict(title=u'b', user={'name': u'joe'}, items=[u'x', u'y']),
+    dict(title=u'b', user={'name': u'ann'}, items=[u'x']),
+    dict(title=u'<b>', user={}, items=[]),
+]
+
+class TestRenderSession(unittest.TestCase):
+    def testSameOutputAsRender(self):
+        for options in RENDER_OPTIONS:
+            template = CountingTemplate(CODE, **options)
+            session = template.session()
+            for kwargs in PARAMS:
+                self.assertEqual(session.render(**kwargs), template.render(**kwargs))
+
+    def testOnlyChangedFragmentsAreRendered(self):
+        template = CountingTemplate(CODE)
+        session = template.session()
+        session.render(**PARAMS[0])
+        self.assertEqual(template.calls, 3)
+        session.render(**PARAMS[1])
+        self.assertEqual(template.calls, 3)
+        session.render(**PARAMS[2])
+        self.assertEqual(template.calls, 4)
+        self.assertEqual(session.getStatistics(), {'fragments': 7, 'rendered': 8, 'reused': 13})
+
+    def testDiff(self):
+        session = CountingTemplate(CODE).session()
+        self.assertEqual(len(session.diff(**PARAMS[0])), 7)
+        self.assertEqual(session.diff(**PARAMS[1]), [])
+        self.assertEqual(session.diff(**PARAMS[2]), [(1, u'B')])
+        self.assertEqual(session.diff(**PARAMS[3]), [(3, u'ann'), (5, u'<li>X</li>')])
+
+    def testSameOutputIsNotInDiff(self):
+        session = Template(u'[If [[$count]] Then=[some] Else=[none]]').session()
+        session.diff(count=1)
+        self.assertEqual(session.diff(count=2), [])
+        self.assertEqual(session.diff(count=0), [(0, u'none')])
+
+    def testReset(self):
+        template = CountingTemplate(CODE)
+        session = template.session()
+        session.render(**PARAMS[0])
+        session.reset()
+        self.assertEqual(len(session.diff(**PARAMS[0])), 7)
+        self.assertEqual(template.calls, 6)
+
+    def testFunctionValues(self):
+        state = {'value': u'a'}
+        f = lambda ip: state['value']
+        session = Template(u'[$f] [$g]').session()
+        self.assertEqual(session.render(f=f, g=u'x'), u'a x')
+        self.assertEqual(session.diff(f=f, g=u'x'), [])
+        state['value'] = u'b'
+        self.assertEqual(session.diff(f=f, g=u'x'), [(0, u'b')])
+
+if __name__ == '__main__':
+    unittest.main()
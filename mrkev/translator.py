@@ -13,33 +13,42 @@ class BaseContext(object):
 
 
 class CallBlock(BaseContext):
-    __slots__ = ('name', )
-    def __init__(self, name):
+    __slots__ = ('name', 'binding', 'span')
+    def __init__(self, name, span=None):
         super(CallBlock, self).__init__()
         self.name = name
+        #filled by mrkev.resolver, None means lookup in block scopes
+        self.binding = None
+        #mrkev.parser.SourceSpan of the block, None when it is not known
+        self.span = span
 
     def __repr__(self):
         return '[call %s]' % (self.name,)
 
 
 class CallParameter(object):
-    __slots__ = ('name', 'lexicalScope', 'inDefaultParameter')
-    def __init__(self, name, lexicalScope, inDefaultParameter):
+    __slots__ = ('name', 'lexicalScope', 'inDefaultParameter', 'slot', 'span')
+    def __init__(self, name, lexicalScope, inDefaultParameter, span=None):
         super(CallParameter, self).__init__()
         self.name = name
         self.lexicalScope = lexicalScope
         self.inDefaultParameter = inDefaultParameter
+        #frame of the lexical scope, parameters of python functions use frame 0
+        self.slot = lexicalScope.slot if lexicalScope is not None else 0
+        self.span = span
 
     def __repr__(self):
         return '[param %s]' % (self.name,)
 
 
 class BlockDefinition(BaseContext):
-    __slots__ = ('name', 'params', 'content')
+    __slots__ = ('name', 'params', 'content', 'slot')
     def __init__(self, name):
         super(BlockDefinition, self).__init__()
         self.name = name
         self.content = []
+        #index of frame holding calls of the definition, see mrkev.resolver
+        self.slot = None
 
     def __repr__(self):
         return '[def %s %s]' % (', '.join('%s=%s' % (p, v) for p, v in self.params.items()), self.content)
@@ -116,15 +125,18 @@ class Translator:
                     continue
             else:
                 if b.name.startswith('>'):
-                    self.translateLink(b)
-                if b.name == '@':
+                    b = self.translateLink(b)
+                name = b.name
+                if name == '@':
                     #translate alias
                     if self.parameterName[-1]:
-                        b.name = self.parameterName[-1]
-                if b.name[0] == '#':
-                    item = CallParameter(b.name, lexicalScope=self.lexicalScope[-1], inDefaultParameter=self.inDefaultParameter[-1])
+                        name = self.parameterName[-1]
+                #parsed spans move with reparsed text, translated program keeps the current place
+                span = b.span.absolute() if b.span is not None else None
+                if name[0] == '#':
+                    item = CallParameter(name, lexicalScope=self.lexicalScope[-1], inDefaultParameter=self.inDefaultParameter[-1], span=span)
                 else:
-                    item = CallBlock(b.name)
+                    item = CallBlock(name, span)
                     for p, value in b.params.items():
                         pname = formParameterName(p)
                         self.parameterName.append(pname)
@@ -143,20 +155,21 @@ class Translator:
             return [seq]
 
     def translateLink(self, block):
+        params = dict(block.params)
         if len(block.name) > 1:
-            block.params['Target'] = [block.name[1:]]
-        block.name = 'Link'
+            params['Target'] = [block.name[1:]]
+        return MarkupBlock('Link', params, block.span)
 
     def translateList(self, blocks):
         rest = []
         result = []
         for b in reversed(blocks):
             if isinstance(b, MarkupBlock) and b.name == '.':
-                b.name = 'Item'
                 rest.reverse()
-                b.params['#'] = rest
+                params = dict(b.params)
+                params['#'] = rest
                 rest = []
-                result.append(b)
+                result.append(MarkupBlock('Item', params, b.span))
             else:
                 rest.append(b)
         result.reverse()